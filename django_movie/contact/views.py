@@ -1,10 +1,13 @@
 from django.views.generic import CreateView
 
+from django_movie.ratelimit import RateLimitMixin
+
 from .models import Contact
 from .forms import ContactForm
 
 
-class ContactView(CreateView):
+class ContactView(RateLimitMixin, CreateView):
+    ratelimit_scope = "contact"
     model = Contact
     form_class = ContactForm
     success_url = "/"
\ No newline at end of file
@@ -0,0 +1,177 @@
+"""Admission control: shed expensive reads before they slow down everything else
+
+Each request gets a cost class:
+- "write": anything but GET/HEAD, always admitted
+- "expensive": deep pages (?page= over ADMISSION_DEEP_PAGE), filters with
+  more than ADMISSION_MAX_FILTERS values, url names in ADMISSION_EXPENSIVE
+  and url names whose recent average latency is over ADMISSION_SLOW_URL
+- "cheap": url names in ADMISSION_CHEAP (pages that answer conditional
+  requests with a 304, see movies/conditional.py), always admitted
+- "normal": the rest
+
+Normal and expensive requests of a worker process share
+ADMISSION_MAX_IN_FLIGHT slots. Expensive ones get at most
+ADMISSION_EXPENSIVE_IN_FLIGHT of them, scaled down as the recent latency
+of the other classes rises over ADMISSION_LATENCY_TARGET. A request
+without a slot waits up to ADMISSION_QUEUE_TIMEOUT for one (expensive
+ones not at all while over the target) and is then answered with a 503
+and Retry-After. Limits are per process, so they only bite with threaded
+or async workers; the latency signal works with any worker type.
+
+Admitted, queued and shed counts per class are added to the shared cache
+stats like the cache counters, see the admission_stats command.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from .cache import flush_stats
+
+CLASSES = ("write", "cheap", "normal", "expensive")
+EVENTS = ("admitted", "queued", "shed", "wait_us")
+STATS = tuple(f"admission_{cost}_{event}" for cost in CLASSES for event in EVENTS)
+EWMA_WEIGHT = 0.2
+
+
+class Ewma:
+    """Moving average that decays towards 0 while nothing is recorded"""
+
+    def __init__(self):
+        self.value, self.at = 0.0, time.monotonic()
+
+    def get(self):
+        age = time.monotonic() - self.at
+        return self.value * 0.5 ** (age / settings.ADMISSION_LATENCY_HALF_LIFE)
+
+    def add(self, sample):
+        current = self.get()
+        self.value, self.at = current + EWMA_WEIGHT * (sample - current), time.monotonic()
+
+
+class Admission:
+    """In-flight slots and latency of one worker process"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.in_flight = dict.fromkeys(CLASSES, 0)
+        self.latency = Ewma()  # of every class but expensive
+        self.url_latency = {}
+        self.stats = dict.fromkeys(STATS, 0)
+        self.flushed_at = time.monotonic()
+
+    def is_slow(self, url_name):
+        ewma = self.url_latency.get(url_name)
+        return ewma is not None and ewma.get() > settings.ADMISSION_SLOW_URL
+
+    def overloaded(self):
+        return self.latency.get() > settings.ADMISSION_LATENCY_TARGET
+
+    def expensive_limit(self):
+        """ADMISSION_EXPENSIVE_IN_FLIGHT, scaled by target/recent latency once over the target"""
+        latency = self.latency.get()
+        if latency <= settings.ADMISSION_LATENCY_TARGET:
+            return settings.ADMISSION_EXPENSIVE_IN_FLIGHT
+        return int(settings.ADMISSION_EXPENSIVE_IN_FLIGHT * settings.ADMISSION_LATENCY_TARGET / latency)
+
+    def has_slot(self, cost):
+        limited = self.in_flight["normal"] + self.in_flight["expensive"]
+        if limited >= settings.ADMISSION_MAX_IN_FLIGHT:
+            return False
+        return cost != "expensive" or self.in_flight["expensive"] < self.expensive_limit()
+
+    def acquire(self, cost):
+        """Take a slot for a request of cost, False if it is shed"""
+        start, shed = time.monotonic(), False
+        with self.lock:
+            if cost in ("normal", "expensive") and not self.has_slot(cost):
+                timeout = settings.ADMISSION_QUEUE_TIMEOUT
+                if cost == "expensive" and self.overloaded():
+                    timeout = 0
+                self.count(cost, "queued")
+                if not self.lock.wait_for(lambda: self.has_slot(cost), timeout):
+                    self.count(cost, "shed")
+                    shed = True
+            if not shed:
+                self.in_flight[cost] += 1
+                self.count(cost, "admitted")
+                self.count(cost, "wait_us", int((time.monotonic() - start) * 1e6))
+        self.flush()
+        return not shed
+
+    def release(self, cost, url_name, duration):
+        with self.lock:
+            self.in_flight[cost] -= 1
+            if cost != "expensive":
+                self.latency.add(duration)
+            if url_name:
+                self.url_latency.setdefault(url_name, Ewma()).add(duration)
+            self.lock.notify_all()
+        self.flush()
+
+    def count(self, cost, event, value=1):
+        """Called with the lock held"""
+        self.stats[f"admission_{cost}_{event}"] += value
+
+    def flush(self):
+        with self.lock:
+            if time.monotonic() - self.flushed_at < settings.CACHE_STATS_INTERVAL:
+                return
+            pending = {name: value for name, value in self.stats.items() if value}
+            self.stats = dict.fromkeys(STATS, 0)
+            self.flushed_at = time.monotonic()
+        flush_stats(pending)
+
+
+admission = Admission()
+
+
+def page_number(request):
+    try:
+        return int(request.GET.get("page", 1))
+    except ValueError:
+        return 1
+
+
+def cost_class(request, url_name):
+    if request.method not in ("GET", "HEAD"):
+        return "write"
+    filters = len(request.GET.getlist("genre")) + len(request.GET.getlist("year"))
+    if page_number(request) > settings.ADMISSION_DEEP_PAGE or filters > settings.ADMISSION_MAX_FILTERS:
+        return "expensive"
+    if url_name in settings.ADMISSION_EXPENSIVE or admission.is_slow(url_name):
+        return "expensive"
+    if url_name in settings.ADMISSION_CHEAP:
+        return "cheap"
+    return "normal"
+
+
+def service_unavailable():
+    response = HttpResponse("Service temporarily overloaded, please retry", status=503)
+    response["Retry-After"] = math.ceil(settings.ADMISSION_RETRY_AFTER)
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Answer expensive requests with a fast 503 while the process is overloaded"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cost = getattr(request, "admission_cost", None)
+        if cost is not None:
+            admission.release(cost, request.resolver_match.url_name, time.monotonic() - request.admitted_at)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.ADMISSION_ENABLED:
+            return None
+        cost = cost_class(request, request.resolver_match.url_name)
+        if not admission.acquire(cost):
+            return service_unavailable()
+        request.admission_cost, request.admitted_at = cost, time.monotonic()
+        return None
@@ -0,0 +1,28 @@
+from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig
+
+
+class StaticFilesAppConfig(StaticFilesConfig):
+    """Staticfiles without CKEditor tests, samples and docs"""
+    ignore_patterns = StaticFilesConfig.ignore_patterns + [
+        "tests",
+        "samples",
+        "ckeditor/ckeditor/*.md",
+        "ckeditor/ckeditor/bender-runner.config.json",
+        "ckeditor/ckeditor/build-config.js",
+        "*.gz",
+        "*.br",
+    ]
+
+
+class DjangoMovieConfig(AppConfig):
+    """Project-level signal wiring"""
+    name = "django_movie"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import flatpages  # noqa: F401 connects the url map invalidation
+        from .db import check_connections
+
+        request_started.connect(check_connections, dispatch_uid="check_connections")
@@ -0,0 +1,157 @@
+"""Shared cache helpers
+
+`get_or_compute` keeps hot keys from stampeding the database: a missing
+key is computed by the one process holding a short `cache.add` lock while
+the others wait for its result, and a present key is recomputed a little
+before it expires with a probability that grows as expiry approaches
+(XFetch), so it usually never goes missing at all.
+
+Keys belong to a namespace ("movies", "contact", "flatpages") whose version is
+part of the key; `bump` invalidates the whole namespace at once. Versions
+live in their own cache (CACHE_VERSIONS_ALIAS) where culling of the main
+one cannot reach them, and a lost one is reseeded from the clock in
+nanoseconds plus a random part, never a version already used. Hit,
+miss and latency counters are kept per process and added to the shared
+cache every few seconds, see the cache_stats command.
+"""
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+NAMESPACES = ("movies", "contact", "flatpages", "movie_objects", "actor_objects", "autocomplete")
+STATS = ("hits", "misses", "early", "waits", "get_us", "compute_us", "computes")
+
+_stats = dict.fromkeys(STATS, 0)
+_stats_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def get_cache():
+    return caches[settings.CACHE_ALIAS]
+
+
+def record(**values):
+    global _flushed_at
+    with _stats_lock:
+        for name, value in values.items():
+            _stats[name] += value
+        if time.monotonic() - _flushed_at < settings.CACHE_STATS_INTERVAL:
+            return
+        pending = {name: value for name, value in _stats.items() if value}
+        _stats.update(dict.fromkeys(STATS, 0))
+        _flushed_at = time.monotonic()
+    flush_stats(pending)
+
+
+def flush_stats(pending):
+    cache = get_cache()
+    for name, value in pending.items():
+        key = f"stats:{name}"
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+
+def read_stats(reset=False, names=STATS):
+    """Counters summed over every process since the last reset"""
+    cache = get_cache()
+    keys = [f"stats:{name}" for name in names]
+    values = cache.get_many(keys)
+    if reset:
+        cache.delete_many(keys)
+    return {name: values.get(f"stats:{name}", 0) for name in names}
+
+
+def get_versions_cache():
+    return caches[settings.CACHE_VERSIONS_ALIAS]
+
+
+def new_version():
+    """Seed of a lost version: nanoseconds plus a random part, so it never repeats an earlier one"""
+    return time.time_ns() + random.getrandbits(16)
+
+
+def namespace_version(namespace):
+    cache = get_versions_cache()
+    version = cache.get(f"ns:{namespace}")
+    if version is None:
+        cache.add(f"ns:{namespace}", new_version(), None)
+        version = cache.get(f"ns:{namespace}")
+    return version
+
+
+def bump(namespace):
+    """Invalidate every key of the namespace, returns the new version"""
+    cache = get_versions_cache()
+    try:
+        return cache.incr(f"ns:{namespace}")
+    except ValueError:
+        version = new_version()
+        cache.set(f"ns:{namespace}", version, None)
+        return version
+
+
+def set_namespace_version(namespace, version):
+    """Announce a version assigned elsewhere, e.g. by a database counter"""
+    get_versions_cache().set(f"ns:{namespace}", version, None)
+
+
+def make_key(namespace, key):
+    return f"{namespace}:{namespace_version(namespace)}:{key}"
+
+
+def compute_and_store(cache, full_key, compute, timeout):
+    start = time.perf_counter()
+    value = compute()
+    delta = time.perf_counter() - start
+    cache.set(full_key, (value, delta, time.time() + timeout), timeout)
+    record(computes=1, compute_us=int(delta * 1e6))
+    return value
+
+
+def get_or_compute(namespace, key, compute, timeout=None, beta=1.0):
+    """Cached compute() for key in namespace, computed by one process at a time"""
+    cache = get_cache()
+    timeout = settings.CACHE_DEFAULT_TIMEOUT if timeout is None else timeout
+    full_key = make_key(namespace, key)
+    lock_key = f"lock:{full_key}"
+
+    start = time.perf_counter()
+    entry = cache.get(full_key)
+    record(get_us=int((time.perf_counter() - start) * 1e6))
+
+    if entry is not None:
+        value, delta, expiry = entry
+        if time.time() - delta * beta * math.log(random.random() or 1e-12) < expiry:
+            record(hits=1)
+            return value
+        # Expiring soon: one process refreshes it, the others keep serving it
+        if not cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+            record(hits=1)
+            return value
+        record(early=1)
+        try:
+            return compute_and_store(cache, full_key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    record(misses=1)
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            return compute_and_store(cache, full_key, compute, timeout)
+        record(waits=1)
+        time.sleep(0.05)
+        entry = cache.get(full_key)
+        if entry is not None:
+            return entry[0]
+    try:
+        return compute_and_store(cache, full_key, compute, timeout)
+    finally:
+        cache.delete(lock_key)
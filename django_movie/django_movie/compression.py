@@ -0,0 +1,138 @@
+"""gzip/brotli compression of responses
+
+The encoding is negotiated from Accept-Encoding (brotli first when the
+brotli package is installed), bodies under COMPRESSION_MIN_SIZE and
+non-text types are left alone. Cacheable responses (with an ETag, not
+private and setting no cookie, so carrying no CSRF token) are compressed once
+at COMPRESSION_CACHED_LEVELS and the bytes are kept in the shared cache
+under the ETag, so repeat hits of the same page version skip
+compression; everything else uses the cheaper COMPRESSION_LEVELS.
+Streaming responses are compressed chunk by chunk.
+"""
+import hashlib
+import re
+import zlib
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from .cache import get_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(r"^(text/|application/(json|javascript|xml)|image/svg\+xml)")
+ACCEPT_RE = re.compile(r"([\w*-]+)\s*(?:;\s*q=([0-9.]+))?")
+
+
+def negotiate(accept_encoding):
+    """Best supported encoding the client accepts, or None"""
+    accepted = {}
+    for coding, q in ACCEPT_RE.findall(accept_encoding.lower()):
+        try:
+            accepted[coding] = float(q) if q else 1.0
+        except ValueError:
+            continue
+    for coding in ("br", "gzip") if brotli else ("gzip",):
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def stream_compressor(encoding, level):
+    """(compress chunk, finish) callables for one stream"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush()), compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)), compressor.flush
+
+
+def compress_stream(chunks, encoding, level):
+    process, finish = stream_compressor(encoding, level)
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def is_cacheable(response):
+    """Whether the body is the same for everyone who gets this ETag"""
+    cache_control = response.get("Cache-Control", "")
+    return (
+        response.has_header("ETag")
+        and "private" not in cache_control
+        and "no-store" not in cache_control
+        and not response.cookies
+    )
+
+
+def weaken_etag(response):
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    """Compress text responses, reusing the compressed body of unchanged pages"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding, settings.COMPRESSION_LEVELS[encoding]
+            )
+            del response["Content-Length"]
+        elif len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        else:
+            body = self.compressed_body(request, response, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response["Content-Length"] = str(len(body))
+        weaken_etag(response)
+        response["Content-Encoding"] = encoding
+        return response
+
+    def should_compress(self, response):
+        return (
+            response.status_code == 200
+            and not response.has_header("Content-Encoding")
+            and not isinstance(response, FileResponse)
+            and COMPRESSIBLE_TYPES.match(response.get("Content-Type", ""))
+        )
+
+    def compressed_body(self, request, response, encoding):
+        if not is_cacheable(response):
+            return compress(response.content, encoding, settings.COMPRESSION_LEVELS[encoding])
+        level = settings.COMPRESSION_CACHED_LEVELS[encoding]
+        digest = hashlib.md5(f"{request.get_full_path()}|{response['ETag']}".encode()).hexdigest()
+        key = f"compressed:{encoding}:{level}:{digest}"
+        cache = get_cache()
+        body = cache.get(key)
+        if body is None:
+            body = compress(response.content, encoding, level)
+            cache.set(key, body, settings.COMPRESSION_CACHE_TIMEOUT)
+        return body
@@ -0,0 +1,22 @@
+"""Database connection helpers"""
+import django
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """CONN_HEALTH_CHECKS for Django < 4.1
+
+    A persistent connection that went away between requests (database
+    restart, idle timeout of a pooler) is closed at the start of the next
+    request instead of failing its first query.
+    """
+    if django.VERSION >= (4, 1):
+        return
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
@@ -0,0 +1,98 @@
+"""Flatpage fallback answered from a URL map instead of a query per 404
+
+The map {language: {url: flatpage id}} of the current site is built once,
+shared through the cache namespace "flatpages" (bumped whenever a
+flatpage changes) and kept in process memory, revalidated against the
+namespace version every FLATPAGES_MAP_TTL seconds. A flatpage url
+without a language prefix is served under every language; a 404 whose
+path is not in the map (bots probing /ru/wp-login.php) is returned as is
+without touching the database.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.flatpages.views import render_flatpage
+from django.contrib.sites.shortcuts import get_current_site
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404, HttpResponsePermanentRedirect
+from django.utils import translation
+
+from .cache import bump, get_or_compute, namespace_version
+
+_maps = {}  # site id -> (checked at, version, map)
+
+
+@receiver(post_save, sender=FlatPage)
+@receiver(post_delete, sender=FlatPage)
+@receiver(m2m_changed, sender=FlatPage.sites.through)
+def invalidate_map(sender, **kwargs):
+    bump("flatpages")
+
+
+def split_language(path):
+    """(language, path without the language prefix), language is None without prefix"""
+    parts = path.split("/", 2)
+    if len(parts) == 3 and parts[1] in dict(settings.LANGUAGES):
+        return parts[1], "/" + parts[2]
+    return None, path
+
+
+def build_map(site_id):
+    languages = [code for code, _ in settings.LANGUAGES]
+    urls = {code: {} for code in languages}
+    for pk, url in FlatPage.objects.filter(sites=site_id).values_list("pk", "url"):
+        language, path = split_language(url)
+        for code in [language] if language else languages:
+            urls[code].setdefault(path, pk)
+    return urls
+
+
+def url_map(site_id):
+    now = time.monotonic()
+    checked_at, version, urls = _maps.get(site_id, (0, None, None))
+    if now - checked_at < settings.FLATPAGES_MAP_TTL:
+        return urls
+    current = namespace_version("flatpages")
+    if current != version:
+        urls = get_or_compute("flatpages", f"urls:{site_id}", lambda: build_map(site_id))
+    _maps[site_id] = (now, current, urls)
+    return urls
+
+
+def find_flatpage(request):
+    """Flatpage id for the request path, a redirect url, or None"""
+    urls = url_map(get_current_site(request).id)
+    language, path = split_language(request.path_info)
+    urls = urls.get(language or translation.get_language(), {})
+    if path in urls:
+        return urls[path], None
+    if settings.APPEND_SLASH and not path.endswith("/") and path + "/" in urls:
+        return None, request.path + "/"
+    return None, None
+
+
+class CachedFlatpageFallbackMiddleware:
+    """FlatpageFallbackMiddleware that only queries for paths known to be flatpages"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.status_code != 404:
+            return response
+        try:
+            pk, redirect_url = find_flatpage(request)
+            if redirect_url:
+                return HttpResponsePermanentRedirect(redirect_url)
+            if pk is None:
+                return response
+            return render_flatpage(request, FlatPage.objects.get(pk=pk))
+        except (Http404, FlatPage.DoesNotExist):
+            return response
+        except Exception:
+            if settings.DEBUG:
+                raise
+            return response
@@ -0,0 +1,116 @@
+"""Per-worker LRU of resolved objects, kept coherent by shared versions
+
+Each worker process keeps up to HOT_OBJECTS_MAX_ENTRIES values per
+HotCache in memory. The cache remembers the version of its namespace in
+the shared cache (see cache.py) and drops all its entries when the
+version changed, so a `bump` from a signal in any process reaches every
+worker on its next lookup without a broadcast. A hit costs one shared
+cache get instead of the queries that load the object.
+
+Hits, misses, invalidations and evictions are added to the shared stats
+like the cache counters; entry count and approximate pickled size of each
+worker are published under WORKERS_KEY, see the hot_objects_stats command.
+"""
+import os
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import flush_stats, get_cache, namespace_version
+
+EVENTS = ("hits", "misses", "invalidations", "evictions")
+WORKERS_KEY = "hot_objects:workers"
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+WORKER_TTL = 600  # workers that published nothing for this long are dropped
+
+
+def stat_names(namespace):
+    return tuple(f"hot_{namespace}_{event}" for event in EVENTS)
+
+
+class HotCache:
+    """LRU of values by key, valid while the shared version of namespace is unchanged"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.entries = OrderedDict()  # key -> (value, pickled size)
+        self.size = 0
+        self.version = None
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(stat_names(namespace), 0)
+        self.flushed_at = time.monotonic()
+
+    def get(self, key, load):
+        """Cached load() for key, None results included"""
+        if not settings.HOT_OBJECTS_ENABLED:
+            return load()
+        version = namespace_version(self.namespace)
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.count("invalidations")
+                self.entries.clear()
+                self.size = 0
+                self.version = version
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            self.count("hits" if entry is not None else "misses")
+        if entry is None:
+            value = load()
+            self.put(key, version, value)
+        else:
+            value = entry[0]
+        self.flush()
+        return value
+
+    def put(self, key, version, value):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            if version != self.version:
+                return  # loaded while the namespace was bumped
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > settings.HOT_OBJECTS_MAX_ENTRIES:
+                self.size -= self.entries.popitem(last=False)[1][1]
+                self.count("evictions")
+
+    def count(self, event):
+        """Called with the lock held"""
+        self.stats[f"hot_{self.namespace}_{event}"] += 1
+
+    def flush(self):
+        with self.lock:
+            if time.monotonic() - self.flushed_at < settings.CACHE_STATS_INTERVAL:
+                return
+            pending = {name: value for name, value in self.stats.items() if value}
+            self.stats = dict.fromkeys(self.stats, 0)
+            self.flushed_at = time.monotonic()
+            footprint = (len(self.entries), self.size)
+        flush_stats(pending)
+        publish_footprint(self.namespace, *footprint)
+
+
+def publish_footprint(namespace, entries, size):
+    """Latest (entries, bytes) of this worker; read-modify-write, good enough for stats"""
+    cache = get_cache()
+    workers = cache.get(WORKERS_KEY) or {}
+    now = time.time()
+    workers = {key: value for key, value in workers.items() if now - value[3] < WORKER_TTL}
+    workers[f"{WORKER}:{namespace}"] = (namespace, entries, size, now)
+    cache.set(WORKERS_KEY, workers, WORKER_TTL)
+
+
+def read_footprints():
+    """[(worker, namespace, entries, bytes)] of the workers seen lately"""
+    workers = get_cache().get(WORKERS_KEY) or {}
+    return sorted(
+        (key.rsplit(":", 1)[0], namespace, entries, size)
+        for key, (namespace, entries, size, _) in workers.items()
+    )
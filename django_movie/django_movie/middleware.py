@@ -0,0 +1,90 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+from .storage import static_root_files
+
+
+def parse_accept_encoding(header):
+    """{coding: q-value} of an Accept-Encoding header, a malformed q-value counts as 0"""
+    qvalues = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    return qvalues
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files with far-future headers and precompressed variants
+
+    Hashed files from the manifest are cached for a year as immutable,
+    everything else gets a short max-age. The .br/.gz sibling written by
+    collectstatic is picked by the q-values of Accept-Encoding, br
+    before gzip when they are equal.
+    """
+    immutable_max_age = 365 * 24 * 60 * 60
+    max_age = 60 * 60
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = "/" + settings.STATIC_URL.strip("/") + "/"
+        self.files = static_root_files()
+        self.immutable = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and request.path_info.startswith(self.prefix):
+            name = request.path_info[len(self.prefix):]
+            if name in self.files and not name.endswith((".gz", ".br")):
+                return self.serve(request, name)
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        path = self.files[name]
+        content_type, _ = mimetypes.guess_type(name)
+        qvalues = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        siblings = self._siblings(name)
+        candidates = [
+            (qvalues.get(coding, qvalues.get("*", 0)), -order, coding, suffix)
+            for order, (coding, suffix) in enumerate(self.encodings)
+            if path + suffix in siblings
+        ]
+        q, _, encoding, suffix = max(candidates, default=(0, 0, None, ""))
+        if q > 0:
+            path += suffix
+        else:
+            encoding = None
+        stat = os.stat(path)
+        etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+        if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type or "application/octet-stream")
+            response["Content-Length"] = stat.st_size
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Vary"] = "Accept-Encoding"
+        if name in self.immutable:
+            response["Cache-Control"] = "public, max-age=%d, immutable" % self.immutable_max_age
+        else:
+            response["Cache-Control"] = "public, max-age=%d" % self.max_age
+        return response
+
+    def _siblings(self, name):
+        return {self.files[n] for n in (name + ".br", name + ".gz") if n in self.files}
@@ -0,0 +1,183 @@
+"""On-demand profiling of requests and management commands
+
+A request is profiled when its URL name is in PROFILING_URL_NAMES, when
+it falls into the PROFILING_SAMPLE_RATE share of requests, or when it
+carries a PROFILING_HEADER signed with `make_token()`. Depending on
+PROFILING_MODE the view, template rendering and ORM work are recorded
+with cProfile (.prof) or with a statistical stack sampler (.collapsed,
+flamegraph-ready). Files go to PROFILING_DIR/<endpoint>/ and the oldest
+are removed beyond PROFILING_MAX_FILES; the profile_report command
+merges them.
+
+Management commands are profiled by running manage.py with
+PROFILE_COMMANDS set to a comma separated list of command names or "*".
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from django.urls import Resolver404, resolve
+
+TOKEN_SALT = "django_movie.profiling"
+
+
+def make_token():
+    """Header value that enables profiling of the requests carrying it"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign("profile")
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def store_path(endpoint, extension):
+    directory = os.path.join(settings.PROFILING_DIR, endpoint)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}{extension}"
+    return os.path.join(directory, name)
+
+
+def rotate():
+    """Remove the oldest profiles beyond PROFILING_MAX_FILES"""
+    files = []
+    for dirpath, _, filenames in os.walk(settings.PROFILING_DIR):
+        files.extend(os.path.join(dirpath, name) for name in filenames)
+    excess = len(files) - settings.PROFILING_MAX_FILES
+    if excess > 0:
+        for path in sorted(files, key=os.path.getmtime)[:excess]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+@lru_cache(maxsize=4096)
+def short_filename(filename):
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path):
+            return filename[len(path):].lstrip(os.sep)
+    return filename
+
+
+def frame_label(code):
+    return f"{code.co_name} ({short_filename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Collapsed stacks of one thread sampled every PROFILING_SAMPLE_INTERVAL"""
+
+    def __init__(self, thread_id=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        interval = settings.PROFILING_SAMPLE_INTERVAL
+        while not self.stopped.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile(endpoint, mode=None):
+    """Profile the block and store the result under endpoint, yields the file path"""
+    mode = mode or settings.PROFILING_MODE
+    if mode == "sample":
+        profiler, path = StackSampler(), store_path(endpoint, ".collapsed")
+        profiler.start()
+    else:
+        profiler, path = cProfile.Profile(), store_path(endpoint, ".prof")
+        profiler.enable()
+    try:
+        yield path
+    finally:
+        if mode == "sample":
+            profiler.stop()
+            profiler.save(path)
+        else:
+            profiler.disable()
+            profiler.dump_stats(path)
+        rotate()
+
+
+def url_name(request):
+    try:
+        return resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+
+
+class ProfilingMiddleware:
+    """Profile selected requests, must come after LocaleMiddleware to resolve i18n urls"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = "HTTP_" + settings.PROFILING_HEADER.upper().replace("-", "_")
+
+    def endpoint(self, request):
+        """Endpoint name if the request is to be profiled, otherwise None"""
+        if not settings.PROFILING_ENABLED:
+            return None
+        token = request.META.get(self.header)
+        if token and valid_token(token):
+            return url_name(request) or "unknown"
+        if settings.PROFILING_URL_NAMES:
+            name = url_name(request)
+            if name in settings.PROFILING_URL_NAMES:
+                return name
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return url_name(request) or "unknown"
+        return None
+
+    def __call__(self, request):
+        endpoint = self.endpoint(request)
+        if endpoint is None:
+            return self.get_response(request)
+        with profile(endpoint) as path:
+            response = self.get_response(request)
+        response["X-Profile"] = os.path.basename(path)
+        return response
+
+
+@contextmanager
+def profile_command(argv):
+    """Profile manage.py commands named in PROFILE_COMMANDS"""
+    names = os.getenv("PROFILE_COMMANDS", "").split(",")
+    command = argv[1] if len(argv) > 1 else "help"
+    if "*" not in names and command not in names:
+        yield
+        return
+    with profile(f"command.{command}") as path:
+        yield
+    sys.stderr.write(f"Profile written to {path}\n")
@@ -0,0 +1,138 @@
+"""Token-bucket rate limiting for write endpoints
+
+Each request takes a token from a per-endpoint bucket and from a
+per-IP bucket shared by all limited endpoints, or from neither when
+one of them is empty. Buckets live in the RATELIMIT_CACHE cache as
+(tokens, timestamp) and are read and written under a lock taken with
+cache.add, so concurrent workers cannot spend the same token.
+"""
+import ipaddress
+import math
+import time
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+@lru_cache(maxsize=None)
+def trusted_networks():
+    return tuple(ipaddress.ip_network(net, strict=False) for net in settings.RATELIMIT_TRUSTED_PROXIES)
+
+
+@lru_cache(maxsize=1024)
+def is_trusted_proxy(ip):
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_networks())
+
+
+LOCK_TIMEOUT = 1  # seconds a crashed worker can keep buckets locked
+LOCK_WAIT = 0.05
+LOCK_RETRY_AFTER = 1
+
+
+def get_client_ip(request):
+    """Client address, reading X-Forwarded-For only through trusted proxies"""
+    remote = request.META.get("REMOTE_ADDR", "")
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if not forwarded or not is_trusted_proxy(remote):
+        return remote
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else remote
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """'10/m' -> (capacity, tokens per second)"""
+    count, period = rate.split("/")
+    seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[-1]] * int(period[:-1] or 1)
+    return int(count), int(count) / seconds
+
+
+@contextmanager
+def locked(cache, keys):
+    """Hold the locks of keys, yields False if one stays taken for LOCK_WAIT"""
+    held, deadline = [], time.monotonic() + LOCK_WAIT
+    try:
+        for key in sorted(keys):
+            while not cache.add(f"{key}:lock", 1, LOCK_TIMEOUT):
+                if time.monotonic() > deadline:
+                    yield False
+                    return
+                time.sleep(0.002)
+            held.append(key)
+        yield True
+    finally:
+        cache.delete_many([f"{key}:lock" for key in held])
+
+
+def take_tokens(buckets):
+    """Seconds to wait before every (key, rate) bucket has a token, 0 if one was taken from each"""
+    cache = caches[settings.RATELIMIT_CACHE]
+    with locked(cache, [key for key, _ in buckets]) as acquired:
+        if not acquired:
+            return LOCK_RETRY_AFTER
+        now = time.time()
+        states = cache.get_many([key for key, _ in buckets])
+        wait, updates, timeout = 0, {}, 0
+        for key, rate in buckets:
+            capacity, refill = parse_rate(rate)
+            tokens, stamp = states.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + (now - stamp) * refill)
+            if tokens < 1:
+                wait = max(wait, (1 - tokens) / refill)
+            updates[key] = (tokens - 1, now)
+            timeout = max(timeout, math.ceil(capacity / refill))
+        if not wait:
+            cache.set_many(updates, timeout)
+        return wait
+
+
+def check_rate_limit(request, scope):
+    """Retry-After seconds if the request is over a limit, otherwise 0"""
+    if not settings.RATELIMIT_ENABLED:
+        return 0
+    ip = get_client_ip(request)
+    rates = settings.RATELIMIT_RATES
+    return take_tokens([(f"rl:{scope}:{ip}", rates[scope]), (f"rl:ip:{ip}", rates["ip"])])
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse("Too many requests", status=429)
+    response["Retry-After"] = math.ceil(retry_after)
+    return response
+
+
+def ratelimit(scope, methods=("POST",)):
+    """Limit a function view with the RATELIMIT_RATES[scope] bucket"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check_rate_limit(request, scope)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMixin:
+    """Limit a class based view with the RATELIMIT_RATES[ratelimit_scope] bucket"""
+    ratelimit_scope = None
+    ratelimit_methods = ("POST",)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in self.ratelimit_methods:
+            retry_after = check_rate_limit(request, self.ratelimit_scope)
+            if retry_after:
+                return too_many_requests(retry_after)
+        return super().dispatch(request, *args, **kwargs)
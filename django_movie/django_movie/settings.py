@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -40,7 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'django_movie.apps.StaticFilesAppConfig',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'ckeditor',
@@ -50,18 +51,24 @@ INSTALLED_APPS = [
     'snowpenguin.django.recaptcha3',
     'allauth',
     'allauth.account',
+    'django_movie.apps.DjangoMovieConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django_movie.middleware.StaticFilesMiddleware',
+    'django_movie.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'django_movie.surrogate.SurrogateKeyMiddleware',
     'django.middleware.locale.LocaleMiddleware',
+    'django_movie.admission.AdmissionControlMiddleware',
+    'django_movie.profiling.ProfilingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'django.contrib.flatpages.middleware.FlatpageFallbackMiddleware'
+    'django_movie.flatpages.CachedFlatpageFallbackMiddleware',
 ]
 
 ROOT_URLCONF = 'django_movie.urls'
@@ -70,8 +77,16 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ] if DEBUG else [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -84,15 +99,121 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'django_movie.wsgi.application'
 
+# Compile templates and url patterns when a worker boots, see django_movie/warmup.py
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', '1') == '1'
+AUTOCOMPLETE_PRELOAD = True
+AUTOCOMPLETE_LIMIT = 10
+MOVIE_BATCH_LIMIT = 50
+FLATPAGES_MAP_TTL = 5
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5}
+COMPRESSION_CACHED_LEVELS = {'gzip': 9, 'br': 9}
+COMPRESSION_CACHE_TIMEOUT = 24 * 60 * 60
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_CHEAP = ['movie_list', 'movie_detail', 'actor_detail', 'autocomplete', 'csrf_token', 'media']
+ADMISSION_EXPENSIVE = ['filter', 'search', 'json_filter', 'movie_batch', 'filmographies']
+ADMISSION_DEEP_PAGE = 20
+ADMISSION_MAX_FILTERS = 5
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '16'))  # per worker process
+ADMISSION_EXPENSIVE_IN_FLIGHT = int(os.getenv('ADMISSION_EXPENSIVE_IN_FLIGHT', '4'))
+ADMISSION_LATENCY_TARGET = float(os.getenv('ADMISSION_LATENCY_TARGET', '0.5'))  # seconds
+ADMISSION_LATENCY_HALF_LIFE = 10
+ADMISSION_SLOW_URL = 1.0
+ADMISSION_QUEUE_TIMEOUT = 0.5
+ADMISSION_RETRY_AFTER = 5
+
+SURROGATE_MAX_AGE = int(os.getenv('SURROGATE_MAX_AGE', '0'))  # 0: the proxy keeps nothing
+SURROGATE_PURGE_URL = os.getenv('SURROGATE_PURGE_URL', '')
+SURROGATE_PURGE_METHOD = os.getenv('SURROGATE_PURGE_METHOD', 'PURGE')
+SURROGATE_PURGE_HEADERS = {}
+SURROGATE_PURGE_BATCH = 256
+SURROGATE_PURGE_TIMEOUT = 2
+
+PRERENDER_ROOT = os.getenv('PRERENDER_ROOT', BASE_DIR / 'prerendered')
+PRERENDER_HOST = os.getenv('PRERENDER_HOST', 'localhost')
+
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+SQLITE_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+}
+
+DATABASE_BACKEND = os.getenv('DATABASE_BACKEND', 'sqlite')
+if DATABASE_BACKEND == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DATABASE_NAME', 'django_movie'),
+            'USER': os.getenv('DATABASE_USER', 'django_movie'),
+            'PASSWORD': os.getenv('DATABASE_PASSWORD', ''),
+            'HOST': os.getenv('DATABASE_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': os.getenv('DATABASE_HEALTH_CHECKS', '1') == '1',
+        },
+        # Source of migrate_sqlite_to_postgres
+        'sqlite': {**SQLITE_DATABASE, 'TEST': {'NAME': BASE_DIR / 'test_sqlite_source.sqlite3'}},
     }
+else:
+    DATABASES = {'default': SQLITE_DATABASE}
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# CACHE_BACKEND=file (single host, default), db (run createcachetable),
+# memcached or redis (CACHE_LOCATION is the server address), locmem (tests).
+# Only memcached and redis increment atomically, with file and db incr is a
+# get and a set. Namespace versions (django_movie/cache.py) are kept in a
+# separate cache that holds a few keys, so culling the default one never
+# drops them.
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem' if sys.argv[1:2] == ['test'] else 'file')
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', BASE_DIR / 'cache'),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'django_cache'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'django_movie'),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': 'django_movie',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000} if CACHE_BACKEND in ('file', 'db', 'locmem') else {},
+    },
+    'versions': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': {
+            'file': BASE_DIR / 'cache' / 'versions',
+            'db': 'django_cache_versions',
+            'locmem': 'django_movie_versions',
+        }.get(CACHE_BACKEND, os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1])),
+        'KEY_PREFIX': 'django_movie_versions',
+        'TIMEOUT': None,
+    },
 }
+CACHE_ALIAS = 'default'
+CACHE_VERSIONS_ALIAS = 'versions'
+CACHE_DEFAULT_TIMEOUT = 300
+CACHE_LOCK_TIMEOUT = 10
+CACHE_STATS_INTERVAL = 5
+
+# Per-worker LRU of movies and actors of detail pages, see django_movie/hotcache.py
+HOT_OBJECTS_ENABLED = os.getenv('HOT_OBJECTS_ENABLED', '1') == '1'
+HOT_OBJECTS_MAX_ENTRIES = int(os.getenv('HOT_OBJECTS_MAX_ENTRIES', '1000'))  # per model and process
+
+# Sessions
+# SESSION_BACKEND=cached_db (default) or signed_cookies. Visitors without a
+# session cookie never load or save one unless a view writes to it, so
+# messages are kept in a cookie rather than the session.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.getenv('SESSION_BACKEND', 'cached_db')
+SESSION_CACHE_ALIAS = 'default'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
 
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend',
@@ -152,12 +273,21 @@ LOCALE_PATHS = (
 STATIC_URL = 'static/'
 STATIC_DIR = os.path.join(BASE_DIR, 'static')
 STATICFILES_DIRS = [STATIC_DIR]
-# STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+STATICFILES_STORAGE = 'django_movie.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# '' streams media through Django, 'nginx' uses X-Accel-Redirect, 'apache' uses X-Sendfile
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_PROTECTED_PREFIXES = []
+MEDIA_MAX_AGE = 24 * 60 * 60
 
 CKEDITOR_UPLOAD_PATH = "uploads/"
+CKEDITOR_IMAGE_BACKEND = "movies.uploads.OptimizingImageBackend"
+CKEDITOR_MAX_IMAGE_SIZE = (1600, 1600)
+CKEDITOR_IMAGE_QUALITY = 82
 
 CKEDITOR_CONFIGS = {
     'default': {
@@ -233,6 +363,34 @@ RECAPTCHA_SCORE_THRESHOLD = 0.5
 
 SITE_ID = 1
 
+BULK_JOB_CHUNK_SIZE = 200
+BULK_JOB_STALE_AFTER = 600  # seconds without progress before another worker resumes a running job
+
+RATING_ROLLUP_BATCH = 200000
+RATING_ROLLUP_LAG = 60
+RATING_ARCHIVE_DIR = os.getenv('RATING_ARCHIVE_DIR', BASE_DIR / 'archive')
+
+# Request profiling, see django_movie/profiling.py
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '1') == '1'
+PROFILING_URL_NAMES = [name for name in os.getenv('PROFILING_URL_NAMES', '').split(',') if name]
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_HEADER = 'X-Profile-Token'
+PROFILING_TOKEN_MAX_AGE = 24 * 60 * 60
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile')  # or 'sample'
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+PROFILING_MAX_FILES = 500
+
+RATELIMIT_ENABLED = True
+RATELIMIT_CACHE = 'default'
+RATELIMIT_TRUSTED_PROXIES = os.getenv('RATELIMIT_TRUSTED_PROXIES', '127.0.0.1,::1').split(',')
+RATELIMIT_RATES = {
+    'ip': '60/m',
+    'rating': '20/m',
+    'review': '5/m',
+    'contact': '3/m',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,68 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always written
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = (
+    ".css", ".js", ".json", ".map", ".svg", ".html", ".htm", ".txt", ".xml",
+    ".ttf", ".otf", ".eot",
+)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed static files with precompressed .gz and .br siblings"""
+    min_compress_size = 256
+
+    def hashed_name(self, name, content=None, filename=None):
+        # The theme css references images that were never shipped,
+        # leave those urls as they are instead of failing the build.
+        if content is None and not self.exists(self.clean_name(name.split("?", 1)[0].split("#", 1)[0])):
+            return name
+        return super().hashed_name(name, content, filename)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, "rb") as f:
+            content = f.read()
+        if len(content) < self.min_compress_size:
+            return
+        self._write_if_smaller(path + ".gz", content, gzip.compress(content, 9, mtime=0))
+        if brotli is not None:
+            self._write_if_smaller(path + ".br", content, brotli.compress(content))
+
+    @staticmethod
+    def _write_if_smaller(path, original, compressed):
+        if len(compressed) < len(original) * 0.95:
+            with open(path, "wb") as f:
+                f.write(compressed)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def static_root_files():
+    """Map of url path -> absolute file path for everything in STATIC_ROOT"""
+    files = {}
+    root = settings.STATIC_ROOT
+    if not root or not os.path.isdir(root):
+        return files
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            files[name] = path
+    return files
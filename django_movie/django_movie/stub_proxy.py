@@ -0,0 +1,101 @@
+"""Minimal caching reverse proxy that honours surrogate keys
+
+For local runs and tests only. GET responses of the upstream with
+`s-maxage` and no cookies are kept in memory per path and Accept-Encoding/
+Accept-Language; requests with cookies go straight to the upstream. A
+PURGE with a Surrogate-Key header drops every kept response tagged with
+one of the keys and is recorded in `purged`. Responses carry X-Cache.
+"""
+import http.client
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+S_MAXAGE_RE = re.compile(r"s-maxage=(\d+)")
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "proxy-connection", "upgrade"}
+
+
+class StubProxy(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, upstream):
+        super().__init__(address, StubProxyHandler)
+        parts = urlsplit(upstream)
+        self.upstream = (parts.hostname, parts.port or 80)
+        self.entries = {}  # (path, encoding, language) -> (expires, status, headers, body, keys)
+        self.purged = []
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def store(self, key, status, headers, body):
+        match = S_MAXAGE_RE.search(dict(headers).get("Cache-Control", ""))
+        if status != 200 or not match or any(name.lower() == "set-cookie" for name, _ in headers):
+            return
+        keys = set(dict(headers).get("Surrogate-Key", "").split())
+        with self.lock:
+            self.entries[key] = (time.monotonic() + int(match.group(1)), status, headers, body, keys)
+
+    def purge(self, keys):
+        keys = set(keys)
+        with self.lock:
+            self.purged.append(sorted(keys))
+            stale = [key for key, entry in self.entries.items() if entry[4] & keys]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+
+class StubProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        key = (self.path, self.headers.get("Accept-Encoding", ""), self.headers.get("Accept-Language", ""))
+        cacheable = "Cookie" not in self.headers
+        entry = self.server.lookup(key) if cacheable else None
+        if entry:
+            _, status, headers, body, _ = entry
+            return self.reply(status, headers, body, "HIT")
+        status, headers, body = self.fetch()
+        if cacheable:
+            self.server.store(key, status, headers, body)
+        self.reply(status, headers, body, "MISS")
+
+    do_HEAD = do_GET
+
+    def do_PURGE(self):
+        count = self.server.purge(self.headers.get("Surrogate-Key", "").split())
+        self.reply(200, [("Content-Type", "text/plain")], f"purged {count}\n".encode(), "PURGE")
+
+    def fetch(self):
+        connection = http.client.HTTPConnection(*self.server.upstream, timeout=30)
+        try:
+            headers = {name: value for name, value in self.headers.items() if name.lower() not in HOP_HEADERS}
+            connection.request("GET", self.path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            headers = [(name, value) for name, value in response.getheaders()
+                       if name.lower() not in HOP_HEADERS | {"content-length"}]
+            return response.status, headers, body
+        finally:
+            connection.close()
+
+    def reply(self, status, headers, body, cache):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Cache", cache)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,120 @@
+"""Surrogate keys for a caching reverse proxy in front of the site
+
+Views name the objects a response shows with `add_keys(request, ...)`:
+"movie-<pk>", "actor-<pk>", "rating-<pk>" (of a movie) for responses
+with rating summaries, "movie-list" for listings and filters, and
+"catalog" for the header and sidebar (categories, genres, years) that
+every HTML page shows. SurrogateKeyMiddleware sends them in the
+Surrogate-Key (space separated: Varnish xkey, Fastly) and Cache-Tag
+(comma separated: Cloudflare, Akamai) headers and, when SURROGATE_MAX_AGE
+is set, lets the proxy keep anonymous responses that long while browsers
+revalidate with the ETag.
+
+Signals call `purge` with the keys of a changed object. Keys are
+collected until the transaction commits and sent to SURROGATE_PURGE_URL
+in one request per SURROGATE_PURGE_BATCH keys; a rolled back
+transaction leaves its keys for the next purge, which is harmless.
+"""
+import http.client
+import logging
+import threading
+import urllib.request
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .views import strip_csrf
+
+logger = logging.getLogger(__name__)
+
+CATALOG = "catalog"
+MOVIE_LIST = "movie-list"
+
+_pending = threading.local()
+
+
+def object_keys(prefix, pks):
+    return [f"{prefix}-{pk}" for pk in pks]
+
+
+def add_keys(request, *keys):
+    """Mark the response to request as showing the objects of keys"""
+    if request is None:
+        return
+    if not hasattr(request, "surrogate_keys"):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(keys)
+
+
+def enabled():
+    return bool(settings.SURROGATE_PURGE_URL)
+
+
+def purge(*keys):
+    """Purge keys from the proxy once the current transaction commits"""
+    if not enabled() or not keys:
+        return
+    if getattr(_pending, "keys", None) is None:
+        _pending.keys = set()
+    _pending.keys.update(keys)
+    transaction.on_commit(send_pending)
+
+
+def send_pending():
+    keys, _pending.keys = getattr(_pending, "keys", None), None
+    if keys:
+        send_purge(sorted(keys))
+
+
+def send_purge(keys):
+    batch = settings.SURROGATE_PURGE_BATCH
+    for start in range(0, len(keys), batch):
+        request = urllib.request.Request(
+            settings.SURROGATE_PURGE_URL,
+            method=settings.SURROGATE_PURGE_METHOD,
+            headers={**settings.SURROGATE_PURGE_HEADERS, "Surrogate-Key": " ".join(keys[start:start + batch])},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=settings.SURROGATE_PURGE_TIMEOUT):
+                pass
+        except (OSError, http.client.HTTPException) as e:
+            # A failed purge must not fail the save; SURROGATE_MAX_AGE bounds the staleness
+            logger.warning("Purge of %d surrogate keys failed: %s", len(keys[start:start + batch]), e)
+
+
+class SurrogateKeyMiddleware:
+    """Surrogate-Key/Cache-Tag headers and the shared cache policy of tagged pages"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        keys = getattr(request, "surrogate_keys", None)
+        if not keys or request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        html = response.get("Content-Type", "").startswith("text/html")
+        if html:
+            keys.add(CATALOG)
+        keys = sorted(keys)
+        response["Surrogate-Key"] = " ".join(keys)
+        response["Cache-Tag"] = ",".join(keys)
+        patch_vary_headers(response, ("Accept-Language",))
+
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+            return response
+        if not settings.SURROGATE_MAX_AGE:
+            return response
+        if settings.CSRF_COOKIE_NAME in response.cookies and html and not response.streaming:
+            # The page used a CSRF token (get_token always sets the cookie).
+            # Shared copies must not carry one visitor's token: forms get
+            # theirs from the csrf_token endpoint, as pre-rendered pages do
+            response.content = strip_csrf(response.content.decode(response.charset)).encode(response.charset)
+            if response.has_header("Content-Length"):
+                response["Content-Length"] = str(len(response.content))
+            del response.cookies[settings.CSRF_COOKIE_NAME]
+        if not response.cookies:
+            patch_cache_control(response, public=True, max_age=0, s_maxage=settings.SURROGATE_MAX_AGE)
+        return response
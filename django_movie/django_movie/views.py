@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import never_cache
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+CSRF_INPUT_RE = re.compile(r'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_SCRIPT = """<script>
+fetch("%s", {credentials: "same-origin"}).then(r => r.json()).then(data => {
+    document.querySelectorAll('input[name=csrfmiddlewaretoken]').forEach(input => input.value = data.token);
+});
+</script>
+"""
+
+
+def media_path(path):
+    """Absolute path of a public media file or Http404"""
+    if any(part.startswith(".") for part in path.split("/")):
+        raise Http404
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+    return fullpath
+
+
+def has_media_access(request, path):
+    """Files under MEDIA_PROTECTED_PREFIXES are for staff only"""
+    if path.startswith(tuple(settings.MEDIA_PROTECTED_PREFIXES)):
+        return request.user.is_authenticated and request.user.is_staff
+    return True
+
+
+def serve_media(request, path):
+    """Media files: offloaded to the front-end server or streamed by Django"""
+    if not has_media_access(request, path):
+        return HttpResponse(status=403)
+    fullpath = media_path(path)
+    stat = os.stat(fullpath)
+    etag = quote_etag("%x-%x" % (int(stat.st_mtime), stat.st_size))
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(path, fullpath)
+        else:
+            response = file_response(request, fullpath, stat.st_size, (etag, http_date(stat.st_mtime)))
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = "public, max-age=%d" % settings.MEDIA_MAX_AGE
+    return response
+
+
+def sendfile_response(path, fullpath):
+    """Empty response telling nginx/apache which file to send"""
+    content_type, _ = mimetypes.guess_type(fullpath)
+    response = HttpResponse(content_type=content_type or "application/octet-stream")
+    if settings.MEDIA_SENDFILE == "nginx":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    else:
+        response["X-Sendfile"] = fullpath
+    return response
+
+
+def file_response(request, fullpath, size, validators=()):
+    """Zero-copy FileResponse, or a 206 stream for a single byte range"""
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or "application/octet-stream"
+    byte_range = parse_range(request.META.get("HTTP_RANGE", ""), size)
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if byte_range is None or (if_range and if_range not in validators):
+        response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+    elif byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */%d" % size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(fullpath, start, end), status=206, content_type=content_type
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = "bytes %d-%d/%d" % (start, end, size)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def parse_range(header, size):
+    """(start, end) of a single byte range, None to ignore, False if unsatisfiable"""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(fullpath, start, end):
+    with open(fullpath, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@never_cache
+def csrf_token(request):
+    """CSRF token (and cookie) for forms of pre-rendered pages"""
+    return JsonResponse({"token": get_token(request)})
+
+
+def strip_csrf(html):
+    """Page without CSRF tokens that fetches the visitor's token from csrf_token"""
+    html = CSRF_INPUT_RE.sub(r"\1\2", html)
+    return html.replace("</body>", CSRF_SCRIPT % reverse("csrf_token") + "</body>", 1)
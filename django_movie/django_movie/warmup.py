@@ -0,0 +1,119 @@
+"""Warm start for freshly booted WSGI/ASGI workers
+
+Everything Django otherwise does lazily on the first requests is done
+here, before the worker accepts traffic: app registry, template
+compilation, URL regexes for every language and translation catalogs.
+The database is only read to build the search index and the connection
+is closed afterwards, so this is safe before forking.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import NoReverseMatch, get_resolver, reverse
+from django.utils import translation
+
+STEPS = []
+
+
+def step(func):
+    STEPS.append(func)
+    return func
+
+
+@contextmanager
+def timed(timings, name):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+@step
+def app_registry():
+    apps.check_apps_ready()
+    apps.get_models()
+
+
+@step
+def templates():
+    """Compile every project template into the cached loader"""
+    count = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            if not str(directory).startswith(str(settings.BASE_DIR)):
+                continue
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if not filename.endswith((".html", ".txt")):
+                        continue
+                    name = os.path.relpath(os.path.join(dirpath, filename), directory).replace(os.sep, "/")
+                    try:
+                        engine.get_template(name)
+                        count += 1
+                    except TemplateSyntaxError:
+                        pass
+    return count
+
+
+def compile_patterns(patterns):
+    count = 0
+    for pattern in patterns:
+        pattern.pattern.regex
+        count += 1
+        if hasattr(pattern, "url_patterns"):
+            count += compile_patterns(pattern.url_patterns)
+    return count
+
+
+@step
+def urls():
+    """Populate the resolver and compile url regexes in every language"""
+    resolver = get_resolver()
+    count = 0
+    for code, _ in settings.LANGUAGES:
+        with translation.override(code):
+            compile_patterns(resolver.url_patterns)
+            names = [name for name in resolver.reverse_dict if isinstance(name, str)]
+            for name in names:
+                try:
+                    reverse(name)
+                except NoReverseMatch:
+                    pass  # needs arguments, the reverse dict is populated anyway
+                count += 1
+    return count
+
+
+@step
+def translations():
+    for code, _ in settings.LANGUAGES:
+        with translation.override(code):
+            translation.gettext("Russian")
+    return len(settings.LANGUAGES)
+
+
+@step
+def autocomplete_index():
+    if not settings.AUTOCOMPLETE_PRELOAD:
+        return
+    from movies.autocomplete import build_all
+    try:
+        build_all()
+    except DatabaseError:
+        pass  # not migrated yet, the index is built on first use
+    finally:
+        connections.close_all()
+
+
+def warm_up(force=False):
+    """Run every warm-up step, returns {step name: seconds}"""
+    timings = {}
+    if not (force or settings.WARMUP_ON_START):
+        return timings
+    for func in STEPS:
+        with timed(timings, func.__name__):
+            func()
+    return timings
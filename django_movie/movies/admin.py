@@ -1,10 +1,17 @@
 from django import forms
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from modeltranslation.admin import TranslationAdmin
 
-from .models import Category, Genre, Movie, MovieShots, Actor, Rating, RatingStar, Reviews
+from . import bulk
+from .models import BulkJob, Category, Genre, Movie, MovieShots, Actor, Rating, RatingDaily, RatingStar, Reviews
+from .paginator import EstimatedCountPaginator
 
 
 class MovieAdminForm(forms.ModelForm):
@@ -17,21 +24,60 @@ class MovieAdminForm(forms.ModelForm):
         fields = '__all__'
 
 
+class RecategorizeForm(forms.Form):
+    """Target category of the recategorize action"""
+    category = forms.ModelChoiceField(label="Категория", queryset=Category.objects.all(), empty_label=None)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset showing one page of the related objects"""
+    per_page = 20
+    page = 1
+
+    def get_queryset(self):
+        if not hasattr(self, "_page_queryset"):
+            self.paginator = Paginator(super().get_queryset(), self.per_page)
+            self.page_obj = self.paginator.get_page(self.page)
+            self.page_range = self.paginator.get_elided_page_range(self.page_obj.number)
+            self._page_queryset = list(self.page_obj.object_list)
+        return self._page_queryset
+
+
+class PaginatedInline(admin.TabularInline):
+    """Tabular inline with page links instead of every related row"""
+    formset = PaginatedInlineFormSet
+    template = "admin/edit_inline/paginated_tabular.html"
+    per_page = 20
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.per_page = self.per_page
+        formset.page_param = f"{self.model._meta.model_name}_page"
+        formset.page = request.GET.get(formset.page_param, 1)
+        return formset
+
+
 @admin.register(Category)
 class CategoryAdmin(TranslationAdmin):
     """Category's"""
     list_display = ("name", "url")
     list_display_links = ("name",)
+    search_fields = ("name",)
 
 
-class ReviewInline(admin.TabularInline):
+class ReviewInline(PaginatedInline):
     """Reviews on the movie page"""
     model = Reviews
     extra = 1
     readonly_fields = ("name", "email")
+    autocomplete_fields = ("parent",)
+    ordering = ("-id",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("movie")
 
 
-class MovieShotsInline(admin.TabularInline):
+class MovieShotsInline(PaginatedInline):
     model = MovieShots
     extra = 1
     readonly_fields = ("get_image",)
@@ -48,11 +94,15 @@ class MovieAdmin(TranslationAdmin):
     list_display = ("title", "category", "url", "draft")
     list_filter = ("category", "year")
     search_fields = ("title", "category__name")
+    list_select_related = ("category",)
+    autocomplete_fields = ("actors", "directors", "genres", "category")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [MovieShotsInline, ReviewInline]
     save_on_top = True
     save_as = True
     list_editable = ("draft",)
-    actions = ["publish", "unpublish"]
+    actions = ["publish", "unpublish", "recategorize", "delete_in_background"]
     form = MovieAdminForm
     readonly_fields = ("get_image",)
     fieldsets = (
@@ -80,23 +130,42 @@ class MovieAdmin(TranslationAdmin):
     def get_image(self, obj):
         return mark_safe(f'<img src={obj.poster.url} width="100" height="110"')
 
+    def enqueue(self, request, action, queryset, **params):
+        """Queue a bulk job and link to its progress page"""
+        job = bulk.enqueue(action, queryset, request.user, **params)
+        url = reverse("admin:movies_bulkjob_change", args=(job.pk,))
+        self.message_user(
+            request, format_html('Задание <a href="{}">#{}</a> поставлено в очередь: {} записей', url, job.pk, job.total)
+        )
+
     def unpublish(self, request, queryset):
         """Remove from publication"""
-        row_update = queryset.update(draft=True)
-        if row_update == 1:
-            message_bit = "1 запись была обновлена"
-        else:
-            message_bit = f"{row_update} записей были обновлены"
-        self.message_user(request, f"{message_bit}")
+        self.enqueue(request, "unpublish", queryset)
 
     def publish(self, request, queryset):
         """Publish"""
-        row_update = queryset.update(draft=False)
-        if row_update == 1:
-            message_bit = "1 запись была обновлена"
-        else:
-            message_bit = f"{row_update} записей были обновлены"
-        self.message_user(request, f"{message_bit}")
+        self.enqueue(request, "publish", queryset)
+
+    def delete_in_background(self, request, queryset):
+        """Delete in the background"""
+        self.enqueue(request, "delete", queryset)
+
+    def recategorize(self, request, queryset):
+        """Move to another category"""
+        form = RecategorizeForm(request.POST if "category" in request.POST else None)
+        if form.is_valid():
+            self.enqueue(request, "recategorize", queryset, category=form.cleaned_data["category"].pk)
+            return None
+        return TemplateResponse(request, "admin/movies/movie/recategorize.html", {
+            **self.admin_site.each_context(request),
+            "title": "Сменить категорию",
+            "opts": self.model._meta,
+            "count": queryset.count(),
+            "form": form,
+            "action_checkbox_name": admin.helpers.ACTION_CHECKBOX_NAME,
+            "selected": request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+            "select_across": request.POST.get("select_across", "0"),
+        })
 
     publish.short_description = "Опубликовать"
     publish.allowed_permissions = ('change', )
@@ -104,6 +173,12 @@ class MovieAdmin(TranslationAdmin):
     unpublish.short_description = "Снять с публикации"
     unpublish.allowed_permissions = ('change',)
 
+    delete_in_background.short_description = "Удалить в фоне"
+    delete_in_background.allowed_permissions = ('delete',)
+
+    recategorize.short_description = "Сменить категорию"
+    recategorize.allowed_permissions = ('change',)
+
     get_image.short_description = "Постер"
 
 
@@ -112,18 +187,25 @@ class ReviewAdmin(admin.ModelAdmin):
     """Movie Reviews"""
     list_display = ("name", "email", "parent", "movie", "id")
     readonly_fields = ("name", "email")
+    search_fields = ("name", "email")
+    list_select_related = ("movie", "parent__movie")
+    autocomplete_fields = ("movie", "parent")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Genre)
 class GenreAdmin(TranslationAdmin):
     """Genre"""
     list_display = ("name", "url")
+    search_fields = ("name",)
 
 
 @admin.register(Actor)
 class ActorAdmin(TranslationAdmin):
     """Actors"""
     list_display = ("name", "age", "get_image")
+    search_fields = ("name",)
     readonly_fields = ("get_image",)
 
     def get_image(self, obj):
@@ -136,6 +218,36 @@ class ActorAdmin(TranslationAdmin):
 class RatingAdmin(admin.ModelAdmin):
     """Rating"""
     list_display = ("star", "movie", "ip")
+    list_select_related = ("star", "movie")
+    autocomplete_fields = ("movie",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(RatingDaily)
+class RatingDailyAdmin(admin.ModelAdmin):
+    """Daily rating histograms built by the rollup_ratings command"""
+    list_display = ("day", "movie", "star", "added", "removed", "net")
+    list_filter = ("star",)
+    list_select_related = ("movie",)
+    date_hierarchy = "day"
+    search_fields = ("movie__title",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def net(self, obj):
+        return obj.added - obj.removed
+
+    net.short_description = "Итого"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(MovieShots)
@@ -143,6 +255,10 @@ class MovieShotsAdmin(TranslationAdmin):
     """Film stills"""
     list_display = ("title", "movie", "get_image")
     readonly_fields = ("get_image",)
+    list_select_related = ("movie",)
+    autocomplete_fields = ("movie",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_image(self, obj):
         return mark_safe(f'<img src={obj.image.url} width="50" height="60"')
@@ -150,6 +266,30 @@ class MovieShotsAdmin(TranslationAdmin):
     get_image.short_description = "Изображение"
 
 
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    """Background bulk actions and their progress"""
+    list_display = ("id", "action", "status", "get_progress", "user", "created_at", "finished_at")
+    list_filter = ("status", "action")
+    list_select_related = ("user",)
+    readonly_fields = ("action", "status", "get_progress", "total", "processed", "params",
+                       "error", "user", "created_at", "started_at", "heartbeat_at", "finished_at")
+    exclude = ("object_ids",)
+
+    def get_progress(self, obj):
+        return format_html(
+            '<progress value="{}" max="{}"></progress> {}/{}', obj.processed, obj.total or 1, obj.processed, obj.total
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    get_progress.short_description = "Прогресс"
+
+
 admin.site.register(RatingStar)
 
 admin.site.site_title = "Django Movies"
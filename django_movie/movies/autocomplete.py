@@ -0,0 +1,236 @@
+"""In-memory prefix index for search typeahead
+
+One index per language. Every word boundary of a title or name gives a
+key ("terminator 2", "2"), keys are kept in a sorted list with a
+parallel array of packed references, so a prefix is a bisect plus a
+short scan. Short prefixes match too much to scan, their top results
+are precomputed. The index is built on first use (or at worker boot).
+Saves and deletes publish the changed pks on commit under the next
+"autocomplete" version, counted in a RollupMark row so that concurrent
+publishes never share one (cache incr is not atomic with every backend);
+every worker applies the changes it missed on its next lookup, or
+rebuilds when they expired.
+"""
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import translation
+
+from django_movie.cache import get_cache, namespace_version, set_namespace_version
+
+from .models import Actor, Movie, RollupMark
+
+MOVIE, ACTOR = 0, 1
+KINDS = {MOVIE: "movie", ACTOR: "actor"}
+MAX_SCAN = 2000
+MAX_KEYS_PER_ITEM = 4
+SHORT_PREFIX = 2
+TOP_SIZE = 20
+NAMESPACE = "autocomplete"
+CHANGES_KEY = "autocomplete:changes:{}"
+CHANGES_TIMEOUT = 3600
+MAX_CHANGES = 1000  # more missed changes than this and the index is rebuilt
+
+
+def normalize(text):
+    return " ".join((text or "").casefold().replace("ё", "е").split())
+
+
+def word_keys(text):
+    words = normalize(text).split()
+    return {" ".join(words[i:]) for i in range(min(len(words), MAX_KEYS_PER_ITEM))}
+
+
+def pack(kind, pk):
+    return pk * 2 + kind
+
+
+class PrefixIndex:
+    def __init__(self, language):
+        self.language = language
+        self.keys = []
+        self.refs = array("q")
+        self.items = {}  # ref -> (score, label, url)
+        self.top = {}
+        self.version = None  # of the "autocomplete" namespace the index is up to date with
+        self.lock = threading.Lock()
+
+    def add(self, kind, pk, label, url, score):
+        ref = pack(kind, pk)
+        if ref in self.items:
+            self.remove(kind, pk)
+        self.items[ref] = (score, label, url)
+        for key in word_keys(label):
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.refs.insert(position, ref)
+        self.top = {}
+
+    def remove(self, kind, pk):
+        ref = pack(kind, pk)
+        item = self.items.pop(ref, None)
+        if item is None:
+            return
+        for key in word_keys(item[1]):
+            position = bisect_left(self.keys, key)
+            while position < len(self.keys) and self.keys[position] == key:
+                if self.refs[position] == ref:
+                    del self.keys[position]
+                    del self.refs[position]
+                    break
+                position += 1
+        self.top = {}
+
+    def load(self, rows):
+        """Bulk build from (kind, pk, label, url, score) rows"""
+        entries = []
+        for kind, pk, label, url, score in rows:
+            ref = pack(kind, pk)
+            self.items[ref] = (score, label, url)
+            entries.extend((key, ref) for key in word_keys(label))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = array("q", (ref for _, ref in entries))
+        self.top = {}
+
+    def matches(self, prefix, limit):
+        refs = set()
+        position = bisect_left(self.keys, prefix)
+        end = min(len(self.keys), position + MAX_SCAN)
+        while position < end and self.keys[position].startswith(prefix):
+            refs.add(self.refs[position])
+            position += 1
+        return heapq.nlargest(limit, refs, key=lambda ref: self.items[ref][0])
+
+    def search(self, text, limit=10):
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX:
+            if prefix not in self.top:
+                self.top[prefix] = self.matches(prefix, TOP_SIZE) if len(self.top) < 10000 else None
+            refs = (self.top[prefix] or self.matches(prefix, limit))[:limit]
+        else:
+            refs = self.matches(prefix, limit)
+        results = []
+        for ref in refs:
+            score, label, url = self.items[ref]
+            results.append({"kind": KINDS[ref % 2], "label": label, "url": url})
+        return results
+
+    def memory(self):
+        """Approximate bytes held by the index"""
+        size = sys.getsizeof(self.keys) + sum(sys.getsizeof(key) for key in self.keys)
+        size += sys.getsizeof(self.refs) + sys.getsizeof(self.items)
+        for item in self.items.values():
+            size += sys.getsizeof(item) + sys.getsizeof(item[1]) + sys.getsizeof(item[2])
+        return size
+
+    def stats(self):
+        memory = self.memory()
+        return {
+            "language": self.language,
+            "items": len(self.items),
+            "keys": len(self.keys),
+            "bytes": memory,
+            "bytes_per_100k_keys": int(memory / max(len(self.keys), 1) * 100000),
+        }
+
+
+def movie_row(movie):
+    return (MOVIE, movie.pk, movie.title, movie.get_absolute_url(), movie.reviews_count)
+
+
+def actor_row(actor):
+    return (ACTOR, actor.pk, actor.name, actor.get_absolute_url(),
+            actor.films_as_actor_count + actor.films_as_director_count)
+
+
+_indexes = {}
+_build_lock = threading.Lock()
+
+
+def movie_rows(movies):
+    return [movie_row(m) for m in movies.filter(draft=False).only(
+        "pk", "title_ru", "title_en", "url", "reviews_count").iterator()]
+
+
+def actor_rows(actors):
+    return [actor_row(a) for a in actors.only(
+        "pk", "name_ru", "name_en", "films_as_actor_count", "films_as_director_count").iterator()]
+
+
+def build_index(language, version=None):
+    index = PrefixIndex(language)
+    index.version = version
+    with translation.override(language):
+        index.load(movie_rows(Movie.objects.all()) + actor_rows(Actor.objects.all()))
+    return index
+
+
+def catch_up(index, version):
+    """Apply the changes published since the index was built, False if some are gone"""
+    if index.version is None or not 0 <= version - index.version <= MAX_CHANGES:
+        return False
+    keys = [CHANGES_KEY.format(v) for v in range(index.version + 1, version + 1)]
+    changes = get_cache().get_many(keys)
+    if len(changes) != len(keys):
+        return False
+    pks = {MOVIE: set(), ACTOR: set()}
+    for kind, changed_pks in changes.values():
+        pks[kind].update(changed_pks)
+    with translation.override(index.language):
+        rows = movie_rows(Movie.objects.filter(pk__in=pks[MOVIE]))
+        rows += actor_rows(Actor.objects.filter(pk__in=pks[ACTOR]))
+    with index.lock:
+        for kind in KINDS:
+            for pk in pks[kind]:
+                index.remove(kind, pk)
+        for row in rows:
+            index.add(*row)
+        index.version = version
+    return True
+
+
+def get_index(language=None):
+    language = language or translation.get_language()
+    version = namespace_version(NAMESPACE)
+    index = _indexes.get(language)
+    if index is None or index.version != version:
+        with _build_lock:
+            index = _indexes.get(language)
+            if index is None or (index.version != version and not catch_up(index, version)):
+                index = _indexes[language] = build_index(language, version)
+    return index
+
+
+def build_all():
+    for code, _ in settings.LANGUAGES:
+        get_index(code)
+
+
+def publish(kind, pks):
+    """Store the change under the next version, announced while the row lock keeps versions in order"""
+    with transaction.atomic():
+        mark, _ = RollupMark.objects.select_for_update().get_or_create(name=NAMESPACE)
+        mark.last_id += 1
+        mark.save(update_fields=["last_id", "updated_at"])
+        get_cache().set(CHANGES_KEY.format(mark.last_id), (kind, list(pks)), CHANGES_TIMEOUT)
+        set_namespace_version(NAMESPACE, mark.last_id)
+
+
+def changed(kind, pks):
+    """Publish saved or deleted Movie/Actor pks to the indexes of every worker on commit"""
+    pks = list(pks)
+    transaction.on_commit(lambda: publish(kind, pks))
+
+
+def autocomplete(text, limit=10):
+    index = get_index()
+    with index.lock:
+        return index.search(text, limit)
@@ -0,0 +1,108 @@
+"""Many movies with a chosen set of fields in one response"""
+from django_movie.surrogate import CATALOG, object_keys
+
+from .loaders import get_loaders
+
+SCALAR_FIELDS = {
+    "id": lambda movie: movie.pk,
+    "title": lambda movie: movie.title,
+    "tagline": lambda movie: movie.tagline,
+    "description": lambda movie: movie.description,
+    "year": lambda movie: movie.year,
+    "country": lambda movie: movie.country,
+    "poster": lambda movie: movie.poster.url if movie.poster else "",
+    "url": lambda movie: movie.get_absolute_url(),
+    "world_premier": lambda movie: movie.world_premier.isoformat(),
+    "budget": lambda movie: movie.budget,
+    "fees_in_usa": lambda movie: movie.fees_in_usa,
+    "fees_in_world": lambda movie: movie.fees_in_world,
+    "reviews_count": lambda movie: movie.reviews_count,
+}
+
+
+def person_json(actor):
+    return {"id": actor.pk, "name": actor.name, "url": actor.get_absolute_url()}
+
+
+def genre_json(genre):
+    return {"id": genre.pk, "name": genre.name, "url": genre.url}
+
+
+def shot_json(shot):
+    return {"id": shot.pk, "title": shot.title, "image": shot.image.url if shot.image else ""}
+
+
+def category_json(category):
+    return category and {"id": category.pk, "name": category.name, "url": category.url}
+
+
+def rating_json(card):
+    return {"avg": card.rating_avg, "count": card.rating_count} if card else {"avg": None, "count": 0}
+
+
+# field: (loader name, key of the movie, json of the loaded value)
+NESTED_FIELDS = {
+    "actors": ("actors", "pk", lambda actors: [person_json(actor) for actor in actors]),
+    "directors": ("directors", "pk", lambda actors: [person_json(actor) for actor in actors]),
+    "genres": ("genres", "pk", lambda genres: [genre_json(genre) for genre in genres]),
+    "shots": ("shots", "pk", lambda shots: [shot_json(shot) for shot in shots]),
+    "category": ("category", "category_id", category_json),
+    "rating": ("rating", "pk", rating_json),
+}
+DEFAULT_FIELDS = ("id", "title", "url", "poster", "year")
+
+
+def parse_fields(value):
+    fields = [field.strip() for field in value.split(",") if field.strip()] if value else list(DEFAULT_FIELDS)
+    unknown = [field for field in fields if field not in SCALAR_FIELDS and field not in NESTED_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def load_movies(request, ids, slugs):
+    """Published movies in the requested order and the keys not found"""
+    loaders = get_loaders(request)
+    by_id = [(key, loaders.movies.load(key)) for key in ids]
+    by_slug = [(key, loaders.movies_by_slug.load(key)) for key in slugs]
+    movies, missing = [], []
+    for key, deferred in by_id + by_slug:
+        movie = deferred.value
+        if movie is None:
+            missing.append(key)
+        elif movie not in movies:
+            movies.append(movie)
+    return movies, missing
+
+
+def serialize(request, movies, fields):
+    loaders = get_loaders(request)
+    rows = []
+    for movie in movies:
+        row = {}
+        for field in fields:
+            if field in SCALAR_FIELDS:
+                row[field] = SCALAR_FIELDS[field](movie)
+            else:
+                loader, key, _ = NESTED_FIELDS[field]
+                row[field] = getattr(loaders, loader).load(getattr(movie, key))
+        rows.append(row)
+    # Every relation is fetched with one query when its first value is read
+    for row in rows:
+        for field, value in row.items():
+            if field in NESTED_FIELDS:
+                row[field] = NESTED_FIELDS[field][2](value.value)
+    return rows
+
+
+def batch_keys(movies, rows, fields):
+    """Surrogate keys of the objects shown in the serialized rows"""
+    keys = {f"movie-{movie.pk}" for movie in movies}
+    for row in rows:
+        for field in ("actors", "directors"):
+            keys.update(f"actor-{actor['id']}" for actor in row.get(field, ()))
+    if "genres" in fields or "category" in fields:
+        keys.add(CATALOG)
+    if "rating" in fields:
+        keys.update(object_keys("rating", [movie.pk for movie in movies]))
+    return keys
@@ -0,0 +1,79 @@
+"""Bulk admin actions executed by the run_bulk_jobs worker
+
+The selected pks are stored on a BulkJob and processed in chunks, each
+in its own short transaction, so voters and reviewers are not blocked
+by one long write. A running job whose worker reported no progress for
+BULK_JOB_STALE_AFTER seconds is claimed again and resumed after its last
+committed chunk; every action is safe to repeat on a chunk.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BulkJob, Movie
+from .signals import bulk_changed
+
+
+def publish(pks, params):
+    Movie.objects.filter(pk__in=pks).update(draft=False, updated_at=timezone.now())
+
+
+def unpublish(pks, params):
+    Movie.objects.filter(pk__in=pks).update(draft=True, updated_at=timezone.now())
+
+
+def delete(pks, params):
+    Movie.objects.filter(pk__in=pks).delete()
+
+
+def recategorize(pks, params):
+    Movie.objects.filter(pk__in=pks).update(category_id=params["category"], updated_at=timezone.now())
+
+
+ACTIONS = {
+    "publish": publish,
+    "unpublish": unpublish,
+    "delete": delete,
+    "recategorize": recategorize,
+}
+
+
+def enqueue(action, queryset, user=None, **params):
+    pks = list(queryset.order_by("pk").values_list("pk", flat=True))
+    return BulkJob.objects.create(action=action, object_ids=pks, params=params, total=len(pks), user=user)
+
+
+def claimable():
+    stale = timezone.now() - timedelta(seconds=settings.BULK_JOB_STALE_AFTER)
+    return Q(status="pending") | Q(status="running", heartbeat_at__lt=stale)
+
+
+def claim_next_job():
+    """Oldest pending or stale running job, marked running so other workers skip it"""
+    for job in BulkJob.objects.filter(claimable()).order_by("id")[:5]:
+        now = timezone.now()
+        if BulkJob.objects.filter(claimable(), pk=job.pk).update(
+                status="running", started_at=Coalesce(F("started_at"), now), heartbeat_at=now):
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job, chunk_size=200):
+    func = ACTIONS[job.action]
+    pks = job.object_ids
+    try:
+        for start in range(job.processed, len(pks), chunk_size):
+            chunk = pks[start:start + chunk_size]
+            with transaction.atomic():
+                func(chunk, job.params)
+                BulkJob.objects.filter(pk=job.pk).update(processed=start + len(chunk), heartbeat_at=timezone.now())
+            bulk_changed.send(sender=Movie, action=job.action, pks=chunk)
+    except Exception as exc:
+        BulkJob.objects.filter(pk=job.pk).update(status="failed", error=repr(exc), finished_at=timezone.now())
+        raise
+    BulkJob.objects.filter(pk=job.pk).update(status="done", finished_at=timezone.now())
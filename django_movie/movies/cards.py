@@ -0,0 +1,99 @@
+"""Movie cards read model
+
+Listings and JSON endpoints read MovieCard rows, one per published movie
+and language, with the translated title, poster rendition, genre names
+and rating summary already resolved. Cards are rebuilt from Movie
+whenever something they show changes, see signals.py and the
+rebuild_cards command; a vote only updates the rating summary.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.utils import timezone, translation
+
+from .models import Movie, MovieCard, Rating
+from .uploads import rendition_for
+
+
+def poster_rendition(movie):
+    if not movie.poster.name:
+        return ""
+    return rendition_for(default_storage, movie.poster.name) or movie.poster.name
+
+
+def rating_summaries(pks):
+    ratings = (
+        Rating.objects.filter(movie_id__in=pks)
+        .order_by()
+        .values("movie_id")
+        .annotate(avg=Avg("star__value"), count=Count("id"))
+    )
+    return {row["movie_id"]: (row["avg"], row["count"]) for row in ratings}
+
+
+def build_cards(movies, ratings):
+    cards = []
+    for movie in movies:
+        poster = poster_rendition(movie)
+        genres = list(movie.genres.all())
+        rating_avg, rating_count = ratings.get(movie.pk, (None, 0))
+        for code, _ in settings.LANGUAGES:
+            with translation.override(code):
+                cards.append(MovieCard(
+                    movie=movie,
+                    language=code,
+                    title=movie.title,
+                    tagline=movie.tagline or "",
+                    url=movie.url,
+                    poster=poster,
+                    year=movie.year,
+                    country=movie.country or "",
+                    genres=", ".join(genre.name for genre in genres),
+                    genre_ids=",%s," % ",".join(str(genre.pk) for genre in genres),
+                    rating_avg=rating_avg,
+                    rating_count=rating_count,
+                ))
+    return cards
+
+
+def refresh_cards(pks):
+    """Rebuild the cards of movies, dropping those of drafts and deleted movies"""
+    pks = set(pks)
+    if not pks:
+        return 0
+    movies = Movie.objects.filter(pk__in=pks, draft=False).prefetch_related("genres")
+    cards = build_cards(movies, rating_summaries(pks))
+    with transaction.atomic():
+        MovieCard.objects.filter(movie_id__in=pks).delete()
+        MovieCard.objects.bulk_create(cards)
+    return len(cards)
+
+
+def refresh_card_ratings(movie_id):
+    """Rating summary of the cards of a movie, without rebuilding them"""
+    summary = Rating.objects.filter(movie_id=movie_id).aggregate(avg=Avg("star__value"), count=Count("id"))
+    return MovieCard.objects.filter(movie_id=movie_id).update(
+        rating_avg=summary["avg"], rating_count=summary["count"], updated_at=timezone.now()
+    )
+
+
+def rebuild_cards(batch_size=500):
+    """Rebuild every card, returns the number of cards written"""
+    MovieCard.objects.exclude(language__in=[code for code, _ in settings.LANGUAGES]).delete()
+    MovieCard.objects.filter(movie__draft=True).delete()
+    pks = list(Movie.objects.values_list("pk", flat=True).order_by("pk"))
+    return sum(refresh_cards(pks[i:i + batch_size]) for i in range(0, len(pks), batch_size))
+
+
+def cards(language=None):
+    return MovieCard.objects.filter(language=language or translation.get_language())
+
+
+def filter_cards(queryset, years, genres):
+    """Cards released in one of years or having one of genres"""
+    condition = Q(year__in=years)
+    for genre in genres:
+        if genre.isdigit():
+            condition |= Q(genre_ids__contains=f",{genre},")
+    return queryset.filter(condition)
@@ -0,0 +1,70 @@
+"""ETag/Last-Modified for public pages
+
+Every page shows the header categories and the sidebar genres, years and
+last movies, so its state is the catalog state plus the shown object.
+All of it is read with a single aggregate over the updated_at indexes.
+"""
+import hashlib
+
+from django.db.models import Count, Max, Subquery
+from django.utils import translation
+from django.views.decorators.http import condition
+
+from .models import Actor, Category, Genre, Movie, MovieCard
+
+
+def latest(queryset):
+    return Subquery(queryset.order_by("-updated_at").values("updated_at")[:1])
+
+
+def language_cards():
+    """Cards in the language of the page, so the (language, updated_at) index is used"""
+    return MovieCard.objects.filter(language=translation.get_language())
+
+
+def catalog_aggregates(**extra):
+    return Movie.objects.order_by().aggregate(
+        movies=Max("updated_at"),
+        movies_count=Count("id"),
+        genres=Max(latest(Genre.objects.all())),
+        categories=Max(latest(Category.objects.all())),
+        **extra
+    )
+
+
+def movie_list_state(request, *args, **kwargs):
+    return catalog_aggregates(cards=Max(latest(language_cards())))
+
+
+def movie_detail_state(request, slug, **kwargs):
+    return catalog_aggregates(movie=Max(latest(Movie.objects.filter(url=slug))))
+
+
+def actor_state(request, slug, **kwargs):
+    return catalog_aggregates(
+        actor=Max(latest(Actor.objects.filter(name=slug))),
+        cards=Max(latest(language_cards())),
+    )
+
+
+def get_state(request, state_func, *args, **kwargs):
+    """State is computed once per request for both etag and last_modified"""
+    if not hasattr(request, "_catalog_state"):
+        request._catalog_state = state_func(request, *args, **kwargs)
+    return request._catalog_state
+
+
+def conditional_page(state_func):
+    """condition() decorator keyed on the page state, language and user"""
+    def etag(request, *args, **kwargs):
+        state = get_state(request, state_func, *args, **kwargs)
+        parts = [translation.get_language(), request.user.pk] + [
+            state[key] for key in sorted(state)
+        ]
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        state = get_state(request, state_func, *args, **kwargs)
+        return max((value for value in state.values() if hasattr(value, "tzinfo")), default=None)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
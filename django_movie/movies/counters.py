@@ -0,0 +1,68 @@
+"""Denormalized counts on Movie and Actor
+
+Saves and deletes of reviews and stills add their delta to the counts of
+their movie with F() in the same transaction (see signals.py).
+Plain saves of a Movie or Actor leave the counts out of the UPDATE (see
+CountedModel), so a stale instance cannot write back old values.
+Filmography counts and repairs (the recount command) are recomputed from
+the child tables with correlated subqueries in one UPDATE.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Actor, Movie, MovieShots, Reviews
+
+
+def child_counts(model, parent_id, sign):
+    """Counter deltas of a movie for one review or still"""
+    if model is MovieShots:
+        return {"shots_count": sign}
+    return {"reviews_count": sign, "threads_count": sign if parent_id is None else 0}
+
+
+def adjust_movies(deltas):
+    """Add {movie_id: {counter: delta}} to the counts and bump updated_at, one UPDATE per movie"""
+    now = timezone.now()
+    for pk, counts in deltas.items():
+        values = {field: F(field) + delta for field, delta in counts.items() if delta}
+        Movie.objects.filter(pk=pk).update(updated_at=now, **values)
+
+
+def count_of(queryset, field):
+    """Correlated COUNT(*) of queryset rows whose field is the outer pk"""
+    counted = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def movie_counters():
+    return {
+        "reviews_count": count_of(Reviews.objects.all(), "movie"),
+        "threads_count": count_of(Reviews.objects.filter(parent__isnull=True), "movie"),
+        "shots_count": count_of(MovieShots.objects.all(), "movie"),
+    }
+
+
+def actor_counters():
+    return {
+        "films_as_actor_count": count_of(Movie.actors.through.objects.all(), "actor"),
+        "films_as_director_count": count_of(Movie.directors.through.objects.all(), "actor"),
+    }
+
+
+def refresh_movies(pks, touch=True):
+    """Recount movies and bump updated_at when their page changed"""
+    values = movie_counters()
+    if touch:
+        values["updated_at"] = timezone.now()
+    return Movie.objects.filter(pk__in=pks).update(**values)
+
+
+def refresh_actors(pks):
+    return Actor.objects.filter(pk__in=pks).update(**actor_counters())
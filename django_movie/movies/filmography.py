@@ -0,0 +1,71 @@
+"""Filmographies of actors and directors
+
+One person can act in and direct the same movie, so the two relations
+are merged into one list of movie cards annotated with the roles. A
+single actor is a paginated card query driven by the indexed actor_id
+columns of both through tables; many actors at once are the same query
+limited per actor, sent as one UNION ALL where the database allows
+LIMIT in compound statements (PostgreSQL) and one by one elsewhere.
+"""
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q, Value
+
+from .cards import cards
+from .models import Movie
+
+ACTED = Movie.actors.through
+DIRECTED = Movie.directors.through
+ORDERING = ("-year", "-movie_id")
+
+
+def roles_of(card):
+    return [role for role, flag in (("director", card.directed), ("actor", card.acted)) if flag]
+
+
+def filmography(actor_id, language=None):
+    """Cards of the actor's movies, newest first, with acted/directed flags"""
+    acted = ACTED.objects.filter(actor_id=actor_id)
+    directed = DIRECTED.objects.filter(actor_id=actor_id)
+    return (
+        cards(language)
+        .filter(Q(movie_id__in=acted.values("movie_id")) | Q(movie_id__in=directed.values("movie_id")))
+        .annotate(
+            acted=Exists(acted.filter(movie_id=OuterRef("movie_id"))),
+            directed=Exists(directed.filter(movie_id=OuterRef("movie_id"))),
+        )
+        .order_by(*ORDERING)
+    )
+
+
+def filmography_page(actor, number, per_page):
+    """Page of the actor's filmography with card.roles set"""
+    paginator = Paginator(filmography(actor.pk), per_page)
+    page = paginator.get_page(number)
+    for card in page.object_list:
+        card.roles = roles_of(card)
+    return page
+
+
+def filmographies(actor_ids, limit, language=None):
+    """{actor_id: [(card, roles)]} with the latest limit movies of each actor"""
+    actor_ids = list(dict.fromkeys(actor_ids))
+    queries = [filmography(actor_id, language).annotate(for_actor=Value(actor_id))[:limit] for actor_id in actor_ids]
+    if len(queries) > 1 and connection.features.supports_slicing_ordering_in_compound:
+        rows = sorted(queries[0].union(*queries[1:], all=True), key=lambda card: (-card.year, -card.movie_id))
+    else:
+        rows = [card for query in queries for card in query]
+    result = {actor_id: [] for actor_id in actor_ids}
+    for card in rows:
+        result[card.for_actor].append((card, roles_of(card)))
+    return result
+
+
+def card_json(card, roles):
+    return {
+        "title": card.title,
+        "url": card.get_absolute_url(),
+        "year": card.year,
+        "poster": card.poster.url if card.poster else "",
+        "roles": roles,
+    }
@@ -0,0 +1,32 @@
+"""Movies and actors of detail pages from the per-worker hot object cache
+
+Movies are cached with the relations their page shows (cast, genres,
+stills) under their url and their id; actors under their name in
+the current language, since the name is translated. The "movie_objects"
+and "actor_objects" versions are bumped in signals.py.
+"""
+from django.utils import translation
+
+from django_movie.hotcache import HotCache
+
+from .models import Actor, Movie
+
+movie_objects = HotCache("movie_objects")
+actor_objects = HotCache("actor_objects")
+
+
+def movie_queryset():
+    return Movie.objects.prefetch_related("actors", "directors", "genres", "movieshots_set")
+
+
+def movie_by_slug(slug):
+    return movie_objects.get(("url", slug), lambda: movie_queryset().filter(url=slug).first())
+
+
+def movie_by_pk(pk):
+    return movie_objects.get(("pk", pk), lambda: movie_queryset().filter(pk=pk).first())
+
+
+def actor_by_slug(slug):
+    language = translation.get_language()
+    return actor_objects.get(("name", language, slug), lambda: Actor.objects.filter(name=slug).first())
@@ -0,0 +1,104 @@
+"""Request-scoped batching loaders
+
+A loader collects the keys asked for with `load()` and fetches all of
+them with one query the first time any of the results is needed, like
+DataLoader. Serializing N movies with their cast, genres and stills is
+then one query per relation instead of one per movie and relation.
+"""
+from collections import defaultdict
+
+from .models import Category, Movie, MovieCard, MovieShots
+
+
+class Deferred:
+    def __init__(self, loader, key):
+        self.loader = loader
+        self.key = key
+
+    @property
+    def value(self):
+        return self.loader.get(self.key)
+
+
+class Loader:
+    """Batches load(key) calls into batch_fn(keys) -> {key: value}"""
+
+    def __init__(self, batch_fn, default=None):
+        self.batch_fn = batch_fn
+        self.default = default
+        self.cache = {}
+        self.queue = set()
+
+    def load(self, key):
+        if key not in self.cache:
+            self.queue.add(key)
+        return Deferred(self, key)
+
+    def load_many(self, keys):
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        keys, self.queue = self.queue, set()
+        if keys:
+            results = self.batch_fn(keys)
+            self.cache.update((key, results.get(key, self.default)) for key in keys)
+
+    def get(self, key):
+        if key in self.queue:
+            self.dispatch()
+        return self.cache.get(key, self.default)
+
+
+def grouped(rows, key):
+    result = defaultdict(list)
+    for row in rows:
+        result[getattr(row, key)].append(row)
+    return result
+
+
+def movies_by_id(ids):
+    return Movie.objects.filter(draft=False).in_bulk(ids)
+
+
+def movies_by_slug(slugs):
+    return Movie.objects.filter(draft=False).in_bulk(slugs, field_name="url")
+
+
+def related_by_movie(through, field):
+    def batch(movie_ids):
+        rows = through.objects.filter(movie_id__in=movie_ids).select_related(field).order_by("id")
+        return {movie_id: [getattr(row, field) for row in rows] for movie_id, rows in grouped(rows, "movie_id").items()}
+    return batch
+
+
+def shots_by_movie(movie_ids):
+    return grouped(MovieShots.objects.filter(movie_id__in=movie_ids).order_by("id"), "movie_id")
+
+
+def categories_by_id(ids):
+    return Category.objects.in_bulk(ids)
+
+
+def cards_by_movie(language):
+    def batch(movie_ids):
+        return {card.movie_id: card for card in MovieCard.objects.filter(language=language, movie_id__in=movie_ids)}
+    return batch
+
+
+class Loaders:
+    def __init__(self, language):
+        self.movies = Loader(movies_by_id)
+        self.movies_by_slug = Loader(movies_by_slug)
+        self.actors = Loader(related_by_movie(Movie.actors.through, "actor"), default=[])
+        self.directors = Loader(related_by_movie(Movie.directors.through, "actor"), default=[])
+        self.genres = Loader(related_by_movie(Movie.genres.through, "genre"), default=[])
+        self.shots = Loader(shots_by_movie, default=[])
+        self.category = Loader(categories_by_id)
+        self.rating = Loader(cards_by_movie(language))
+
+
+def get_loaders(request):
+    """Loaders shared by everything serving this request"""
+    if not hasattr(request, "_loaders"):
+        request._loaders = Loaders(request.LANGUAGE_CODE)
+    return request._loaders
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from django_movie.admission import CLASSES, STATS
+from django_movie.cache import read_stats
+
+
+class Command(BaseCommand):
+    help = "Show admitted, queued and shed requests per cost class summed over all workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = read_stats(reset=options["reset"], names=STATS)
+        for cost in CLASSES:
+            admitted, queued, shed, wait_us = (
+                stats[f"admission_{cost}_{event}"] for event in ("admitted", "queued", "shed", "wait_us")
+            )
+            total = admitted + shed
+            self.stdout.write(
+                f"{cost:<10} admitted {admitted:>8}  queued {queued:>6}  shed {shed:>6}"
+                f" ({shed / max(total, 1):.1%})  average wait {wait_us / max(admitted, 1) / 1000:.2f} ms"
+            )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from movies.models import RatingEvent
+from movies.ratings import archive_month
+
+
+class Command(BaseCommand):
+    help = "Export rolled up months of the rating event log to gzipped files and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=int, help="YYYYMM, by default every month older than --keep")
+        parser.add_argument("--keep", type=int, default=3, help="Months to keep in the database")
+        parser.add_argument("--dir")
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            months = [options["month"]]
+        else:
+            now = timezone.now()
+            index = now.year * 12 + now.month - 1 - options["keep"]
+            oldest = index // 12 * 100 + index % 12 + 1
+            months = RatingEvent.objects.filter(month__lte=oldest).order_by("month").values_list(
+                "month", flat=True).distinct()
+        for month in months:
+            try:
+                path, count = archive_month(month, options["dir"])
+            except ValueError as e:
+                raise CommandError(e)
+            self.stdout.write(f"{month}: {count} events archived to {path}")
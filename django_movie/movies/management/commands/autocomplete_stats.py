@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.autocomplete import MOVIE, PrefixIndex, build_index
+
+
+class Command(BaseCommand):
+    help = "Build the typeahead indexes and report their size and lookup time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthetic", type=int, default=0, help="also measure an index of N generated titles")
+
+    def handle(self, *args, **options):
+        for code, _ in settings.LANGUAGES:
+            start = time.perf_counter()
+            index = build_index(code)
+            self.report(index, time.perf_counter() - start)
+        if options["synthetic"]:
+            index = PrefixIndex("synthetic")
+            start = time.perf_counter()
+            index.load(
+                (MOVIE, pk, f"Movie title {pk} part {pk % 7}", f"/movie-{pk}/", pk % 100)
+                for pk in range(1, options["synthetic"] + 1)
+            )
+            self.report(index, time.perf_counter() - start)
+
+    def report(self, index, build_time):
+        stats = index.stats()
+        start = time.perf_counter()
+        for prefix in ("m", "mo", "movie t", "te", "ter", "2"):
+            index.search(prefix)
+        lookup = (time.perf_counter() - start) / 6
+        self.stdout.write(
+            f"{stats['language']}: {stats['items']} items, {stats['keys']} keys, "
+            f"{stats['bytes'] / 1024:.0f} KiB ({stats['bytes_per_100k_keys'] / 2 ** 20:.1f} MiB per 100k keys), "
+            f"built in {build_time * 1000:.0f} ms, {lookup * 1000:.2f} ms per lookup"
+        )
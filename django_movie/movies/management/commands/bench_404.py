@@ -0,0 +1,47 @@
+import random
+import string
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+STOCK = "django.contrib.flatpages.middleware.FlatpageFallbackMiddleware"
+CACHED = "django_movie.flatpages.CachedFlatpageFallbackMiddleware"
+
+
+def bot_paths(n):
+    names = ["wp-login.php", "xmlrpc.php", ".env", "admin.php", "phpmyadmin/", "wp-admin/setup-config.php"]
+    for _ in range(n):
+        noise = "".join(random.choices(string.ascii_lowercase, k=6))
+        yield f"/{random.choice(['ru', 'en'])}/{noise}/{random.choice(names)}"
+
+
+class Command(BaseCommand):
+    help = "Benchmark 404 throughput with the stock and the cached flatpage fallback"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--requests", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+        middleware = [m for m in settings.MIDDLEWARE if m not in (STOCK, CACHED)]
+        for label, fallback in (("stock fallback", STOCK), ("cached fallback", CACHED)):
+            with override_settings(MIDDLEWARE=middleware + [fallback], DEBUG=False):
+                self.report(label, n)
+
+    def report(self, label, n):
+        client = Client()
+        client.get("/ru/warm-up-404/")
+        paths = list(bot_paths(n))
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for path in paths:
+                response = client.get(path)
+                assert response.status_code == 404, (path, response.status_code)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<16} {n / elapsed:>8.0f} req/s  {len(queries) / n:>5.2f} queries/req"
+        )
@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import translation
+
+from django_movie.cache import get_cache
+from django_movie.compression import brotli, compress
+
+from ...models import Movie
+
+LEVELS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("br", 1), ("br", 5), ("br", 9), ("br", 11)]
+
+
+class Command(BaseCommand):
+    help = "Bytes out and CPU per request for each compression level on real pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", "--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        ids = list(Movie.objects.filter(draft=False).values_list("pk", flat=True)[:settings.MOVIE_BATCH_LIMIT])
+        if not ids:
+            raise CommandError("No published movies to render")
+        with translation.override("ru"):
+            urls = [
+                reverse("movie_list"),
+                Movie.objects.get(pk=ids[0]).get_absolute_url(),
+                reverse("movie_batch") + "?ids=" + ",".join(map(str, ids)),
+            ]
+        client = Client()
+        for url in urls:
+            response = client.get(url, HTTP_ACCEPT_ENCODING="identity")
+            if response.status_code != 200:
+                raise CommandError(f"{url} answered {response.status_code}")
+            self.report(url, response.content, options["requests"])
+
+    def report(self, url, body, n):
+        self.stdout.write(f"{url} {len(body)} bytes")
+        for encoding, level in LEVELS:
+            if encoding == "br" and brotli is None:
+                continue
+            ms, size = self.measure(lambda: compress(body, encoding, level), n)
+            self.stdout.write(
+                f"  {encoding:<4} {level:>2} {size:>8} bytes {size / len(body):>6.1%} {ms:>8.3f} ms/req"
+            )
+        cache = get_cache()
+        cache.set("bench:compressed", compress(body, "gzip", 9), 60)
+        ms, size = self.measure(lambda: cache.get("bench:compressed"), n)
+        self.stdout.write(f"  cached   {size:>8} bytes        {ms:>8.3f} ms/req")
+        cache.delete("bench:compressed")
+
+    def measure(self, work, n):
+        start = time.process_time()
+        for _ in range(n):
+            data = work()
+        return (time.process_time() - start) * 1000 / n, len(data)
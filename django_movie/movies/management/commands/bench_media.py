@@ -0,0 +1,63 @@
+import time
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+
+from django_movie.views import media_path, serve_media
+
+
+class Command(BaseCommand):
+    help = "Benchmark media serving: Python streaming vs X-Accel-Redirect offload"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="movies/Terminator.jpg", help="file under MEDIA_ROOT")
+        parser.add_argument("-n", "--requests", type=int, default=500)
+        parser.add_argument("--nginx", help="base url of a local nginx proxying to this site, e.g. http://127.0.0.1:8080")
+
+    def handle(self, *args, **options):
+        path, n = options["path"], options["requests"]
+        try:
+            media_path(path)
+        except Exception:
+            raise CommandError(f"{path} is not a file under MEDIA_ROOT")
+        factory = RequestFactory()
+
+        def python_full():
+            return factory.get("/media/" + path)
+
+        def python_range():
+            return factory.get("/media/" + path, HTTP_RANGE="bytes=0-1023")
+
+        self.report("python, full file", n, python_full, expected=200)
+        self.report("python, 1KB range", n, python_range, expected=206)
+        with override_settings(MEDIA_SENDFILE="nginx"):
+            self.report("X-Accel-Redirect", n, python_full, expected=200, offloaded=True)
+        if options["nginx"]:
+            self.report_http("nginx", n, options["nginx"].rstrip("/") + "/media/" + path)
+
+    def report(self, label, n, make_request, expected, offloaded=False):
+        body_bytes = 0
+        start = time.perf_counter()
+        for _ in range(n):
+            request = make_request()
+            response = serve_media(request, request.path[len("/media/"):])
+            if response.status_code != expected:
+                raise CommandError(f"{label}: unexpected status {response.status_code}")
+            if offloaded and (not response.has_header("X-Accel-Redirect") or response.content):
+                raise CommandError(f"{label}: response was not offloaded")
+            body_bytes += sum(len(chunk) for chunk in response)
+            response.close()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:<20} {n / elapsed:>9.0f} req/s  {body_bytes / n:>10.0f} bytes/req through Python"
+        )
+
+    def report_http(self, label, n, url):
+        body_bytes = 0
+        start = time.perf_counter()
+        for _ in range(n):
+            with urlopen(Request(url)) as response:
+                body_bytes += len(response.read())
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<20} {n / elapsed:>9.0f} req/s  {body_bytes / n:>10.0f} bytes/req over HTTP")
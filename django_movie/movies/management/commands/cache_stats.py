@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from django_movie.cache import NAMESPACES, namespace_version, read_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters and latency of the shared cache summed over all workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = read_stats(reset=options["reset"])
+        lookups = stats["hits"] + stats["misses"]
+        self.stdout.write(f"Backend: {settings.CACHES[settings.CACHE_ALIAS]['BACKEND']}")
+        self.stdout.write(f"Lookups: {lookups}, hits {stats['hits']}, misses {stats['misses']}"
+                          f" ({stats['hits'] / max(lookups, 1):.1%} hit rate)")
+        self.stdout.write(f"Early recomputes: {stats['early']}, lock waits: {stats['waits']}")
+        self.stdout.write(f"Average get: {stats['get_us'] / max(lookups, 1) / 1000:.2f} ms")
+        self.stdout.write(f"Computes: {stats['computes']},"
+                          f" average {stats['compute_us'] / max(stats['computes'], 1) / 1000:.2f} ms")
+        for namespace in NAMESPACES:
+            self.stdout.write(f"Namespace {namespace}: version {namespace_version(namespace)}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from django_movie.cache import namespace_version, read_stats
+from django_movie.hotcache import read_footprints, stat_names
+from movies.hot_objects import actor_objects, movie_objects
+
+
+class Command(BaseCommand):
+    help = "Show hit ratio of the hot object caches summed over all workers and their size per worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        for namespace in (movie_objects.namespace, actor_objects.namespace):
+            names = stat_names(namespace)
+            hits, misses, invalidations, evictions = read_stats(reset=options["reset"], names=names).values()
+            self.stdout.write(
+                f"{namespace:<14} hits {hits:>8}  misses {misses:>6} ({hits / max(hits + misses, 1):.1%} hit rate)"
+                f"  invalidations {invalidations:>5}  evictions {evictions:>5}"
+                f"  version {namespace_version(namespace)}"
+            )
+        for worker, namespace, entries, size in read_footprints():
+            self.stdout.write(f"{worker:<30} {namespace:<14} {entries:>6} entries  {size / 1024:>9.1f} KiB")
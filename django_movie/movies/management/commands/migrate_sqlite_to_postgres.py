@@ -0,0 +1,96 @@
+import io
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+
+def copy_value(value):
+    """A value in the COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copied_models():
+    """Every table of the project, m2m through tables and translated columns included"""
+    models, tables = [], set()
+    for model in apps.get_models(include_auto_created=True):
+        opts = model._meta
+        if opts.managed and not opts.proxy and opts.db_table not in tables:
+            tables.add(opts.db_table)
+            models.append(model)
+    return models
+
+
+def is_migrated(connection):
+    executor = MigrationExecutor(connection)
+    return not executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+class Command(BaseCommand):
+    help = "Copy every table of the SQLite database into PostgreSQL with COPY, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default="sqlite", help="Database alias of the SQLite database")
+        parser.add_argument("--database", default="default", help="Database alias of the PostgreSQL database")
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options["source"] not in connections.databases:
+            raise CommandError(f"No database alias {options['source']}, set DATABASE_BACKEND=postgresql")
+        source, target = connections[options["source"]], connections[options["database"]]
+        if source.vendor != "sqlite" or target.vendor != "postgresql":
+            raise CommandError("The source must be SQLite and the target PostgreSQL")
+        if not is_migrated(source) or not is_migrated(target):
+            raise CommandError(f"Run migrate on both databases first (migrate --database {source.alias})")
+
+        models = copied_models()
+        tables = ", ".join(target.ops.quote_name(model._meta.db_table) for model in models)
+        start = time.monotonic()
+        with transaction.atomic(using=target.alias):
+            # Foreign keys are DEFERRABLE INITIALLY DEFERRED, checked once at commit
+            with target.cursor() as cursor:
+                cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+            for model in models:
+                rows = self.copy_table(source, target, model, options["chunk_size"])
+                self.stdout.write(f"{model._meta.db_table}: {rows} rows")
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(models)} tables in {time.monotonic() - start:.1f}s"))
+
+    def copy_table(self, source, target, model, chunk_size):
+        columns = [field.column for field in model._meta.local_concrete_fields]
+        table = model._meta.db_table
+        select = "SELECT {} FROM {}".format(
+            ", ".join(source.ops.quote_name(c) for c in columns), source.ops.quote_name(table)
+        )
+        copy = "COPY {} ({}) FROM STDIN".format(
+            target.ops.quote_name(table), ", ".join(target.ops.quote_name(c) for c in columns)
+        )
+        copied = 0
+        with source.cursor() as reader, target.cursor() as writer:
+            reader.execute(select)
+            while True:
+                rows = reader.fetchmany(chunk_size)
+                if not rows:
+                    break
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write("\t".join(map(copy_value, row)))
+                    buffer.write("\n")
+                buffer.seek(0)
+                writer.copy_expert(copy, buffer)
+                copied += len(rows)
+            writer.execute(f"SELECT COUNT(*) FROM {target.ops.quote_name(table)}")
+            if writer.fetchone()[0] != copied:
+                raise CommandError(f"{table}: row count differs after the copy")
+        return copied
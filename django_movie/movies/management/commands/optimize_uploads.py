@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from movies.models import Actor, Movie
+from movies.uploads import is_rendition, rendition_for, rewrite_images
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+def optimize(path):
+    return path, rendition_for(default_storage, path)
+
+
+class Command(BaseCommand):
+    help = "Create optimized renditions of existing CKEditor uploads and rewrite descriptions to use them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        upload_path = settings.CKEDITOR_UPLOAD_PATH.rstrip("/")
+        if not default_storage.exists(upload_path):
+            self.stdout.write("No uploads")
+            return
+        paths = [
+            path for path in walk(default_storage, upload_path)
+            if not is_rendition(path) and "_thumb." not in os.path.basename(path)
+        ]
+        connections.close_all()
+        with ProcessPoolExecutor(options["workers"]) as pool:
+            renditions = dict(pool.map(optimize, paths, chunksize=16))
+        self.stdout.write(f"{sum(1 for r in renditions.values() if r)} of {len(paths)} uploads optimized")
+
+        fields = [f"description_{code}" for code, _ in settings.LANGUAGES]
+        for model in (Movie, Actor):
+            changed = self.rewrite(model, fields, renditions, options["batch_size"])
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {changed} descriptions rewritten")
+
+    def rewrite(self, model, fields, renditions, batch_size):
+        changed, batch = 0, []
+        for obj in model.objects.only("pk", *fields).iterator(chunk_size=batch_size):
+            updated = False
+            for field in fields:
+                html = getattr(obj, field)
+                new_html = rewrite_images(html, renditions)
+                if new_html != html:
+                    setattr(obj, field, new_html)
+                    updated = True
+            if updated:
+                batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_update(batch, fields)
+                changed, batch = changed + len(batch), []
+        if batch:
+            model.objects.bulk_update(batch, fields)
+            changed += len(batch)
+        return changed
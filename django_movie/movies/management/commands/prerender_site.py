@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from movies.prerender import public_pages, read_manifest, remove_stale, render_pages, write_manifest
+
+
+class Command(BaseCommand):
+    help = "Render public catalog pages to PRERENDER_ROOT for nginx, re-rendering only pages whose rows changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--full", action="store_true", help="Render every page even if unchanged")
+        parser.add_argument("--root", default=settings.PRERENDER_ROOT)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        root = str(options["root"])
+        manifest = read_manifest(root)
+        pages = dict(public_pages())
+        changed = [url for url, state in pages.items() if options["full"] or manifest.get(url) != state]
+        workers = max(1, min(options["workers"], len(changed)))
+        chunks = [changed[i::workers] for i in range(workers)]
+
+        connections.close_all()
+        with ProcessPoolExecutor(workers) as pool:
+            results = [result for chunk in pool.map(partial(render_pages, root), chunks) for result in chunk]
+
+        failed = {url: status for url, status in results if status != 200}
+        rendered = len(results) - len(failed)
+        # Failed pages are left out of the manifest so that the next build retries them
+        write_manifest(root, {url: state for url, state in pages.items() if url not in failed})
+        stale = set(manifest) - set(pages)
+        remove_stale(root, stale)
+
+        self.stdout.write(
+            f"{len(pages)} pages: {rendered} rendered, {len(pages) - len(changed)} unchanged,"
+            f" {len(stale)} removed in {time.perf_counter() - start:.1f} s"
+        )
+        for url, status in failed.items():
+            self.stderr.write(f"{url}: {status}")
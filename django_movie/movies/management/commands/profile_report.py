@@ -0,0 +1,80 @@
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def profile_files(endpoint, extension):
+    directory = os.path.join(settings.PROFILING_DIR, endpoint)
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(extension)
+    )
+
+
+def merge_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    stacks[stack] += int(count)
+    return stacks
+
+
+class Command(BaseCommand):
+    help = "Merge stored request and command profiles per endpoint into pstats or collapsed stacks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("endpoints", nargs="*", help="Endpoints to merge, all by default")
+        parser.add_argument("--format", choices=("list", "pstats", "collapsed"), default="list")
+        parser.add_argument("--output", help="Directory for <endpoint>.prof / <endpoint>.collapsed files")
+        parser.add_argument("--sort", default="cumulative")
+        parser.add_argument("--top", type=int, default=30)
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(settings.PROFILING_DIR):
+            raise CommandError(f"No profiles in {settings.PROFILING_DIR}")
+        endpoints = options["endpoints"] or sorted(os.listdir(settings.PROFILING_DIR))
+        if options["output"]:
+            os.makedirs(options["output"], exist_ok=True)
+        for endpoint in endpoints:
+            if not os.path.isdir(os.path.join(settings.PROFILING_DIR, endpoint)):
+                raise CommandError(f"No profiles for {endpoint}")
+            if options["format"] == "list":
+                self.stdout.write(f"{endpoint}: {len(profile_files(endpoint, '.prof'))} cProfile,"
+                                  f" {len(profile_files(endpoint, '.collapsed'))} sampled")
+            elif options["format"] == "pstats":
+                self.write_pstats(endpoint, profile_files(endpoint, ".prof"), options)
+            else:
+                self.write_collapsed(endpoint, profile_files(endpoint, ".collapsed"), options)
+
+    def write_pstats(self, endpoint, paths, options):
+        if not paths:
+            return
+        stream = io.StringIO()
+        stats = pstats.Stats(*paths, stream=stream)
+        if options["output"]:
+            path = os.path.join(options["output"], f"{endpoint}.prof")
+            stats.dump_stats(path)
+            self.stdout.write(f"{endpoint}: {len(paths)} profiles merged into {path}")
+        else:
+            stats.sort_stats(options["sort"]).print_stats(options["top"])
+            self.stdout.write(f"== {endpoint} ({len(paths)} profiles)")
+            self.stdout.write(stream.getvalue())
+
+    def write_collapsed(self, endpoint, paths, options):
+        if not paths:
+            return
+        stacks = merge_collapsed(paths)
+        lines = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        if options["output"]:
+            path = os.path.join(options["output"], f"{endpoint}.collapsed")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(lines)
+            self.stdout.write(f"{endpoint}: {len(paths)} profiles merged into {path}")
+        else:
+            self.stdout.write(lines, ending="")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from movies.cards import rebuild_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the movie cards read by listings and JSON endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_cards(options["batch_size"])
+        self.stdout.write(f"{count} cards written")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from django_movie.cache import bump
+from movies.counters import refresh_actors, refresh_movies
+from movies.models import Actor, Movie
+
+
+class Command(BaseCommand):
+    help = "Recompute review, still and filmography counters in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, refresh in ((Movie, lambda pks: refresh_movies(pks, touch=False)), (Actor, refresh_actors)):
+            pks = list(model.objects.order_by("pk").values_list("pk", flat=True))
+            for start in range(0, len(pks), options["chunk_size"]):
+                with transaction.atomic():
+                    refresh(pks[start:start + options["chunk_size"]])
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {len(pks)} recounted")
+        bump("movie_objects")
+        bump("actor_objects")
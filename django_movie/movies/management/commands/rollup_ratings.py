@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.ratings import rollup
+
+
+class Command(BaseCommand):
+    help = "Aggregate new rating events into daily per-movie histograms"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--lag", type=int, help="Leave events of the last LAG seconds for the next run")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rollup(options["batch_size"], options["lag"])
+        self.stdout.write(f"{count} events rolled up in {time.perf_counter() - start:.1f} s")
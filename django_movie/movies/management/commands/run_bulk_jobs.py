@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.bulk import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Worker executing queued bulk admin actions in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=settings.BULK_JOB_CHUNK_SIZE)
+        parser.add_argument("--sleep", type=float, default=2.0, help="seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+            self.stdout.write(f"{job}: {job.total} objects")
+            try:
+                run_job(job, options["chunk_size"])
+            except Exception as exc:
+                self.stderr.write(f"{job} failed: {exc!r}")
+            else:
+                self.stdout.write(f"{job} done")
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT_SCRIPT = """
+import json, os, time
+start = time.perf_counter()
+from django_movie.wsgi import application
+boot = time.perf_counter() - start
+from django_movie.warmup import warm_up
+print(json.dumps({"boot": boot, "steps": warm_up(force=True)}))
+"""
+
+
+def parse_importtime(output):
+    """Own import microseconds summed per top level package from python -X importtime"""
+    totals = defaultdict(int)
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(own)
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Report import time per package and warm-up time per step of a fresh worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20)
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, WARMUP_ON_START="0")
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr[-2000:])
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.stdout.write("Imports (ms)")
+        totals = parse_importtime(process.stderr)
+        for name, micros in sorted(totals.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"  {name:<30} {micros / 1000:>8.1f}")
+        self.stdout.write(f"WSGI application created in {result['boot'] * 1000:.1f} ms")
+        self.stdout.write("Warm-up (ms)")
+        for name, seconds in result["steps"].items():
+            self.stdout.write(f"  {name:<30} {seconds * 1000:>8.1f}")
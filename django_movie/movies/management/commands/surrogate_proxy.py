@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from django_movie.stub_proxy import StubProxy
+
+
+class Command(BaseCommand):
+    help = "Run the stub caching proxy in front of a running site, for trying out purges locally"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8080)
+        parser.add_argument("--upstream", default="http://127.0.0.1:8000")
+
+    def handle(self, *args, **options):
+        server = StubProxy(("127.0.0.1", options["port"]), options["upstream"])
+        self.stdout.write(
+            f"Proxying {options['upstream']} on http://127.0.0.1:{options['port']}/, "
+            f"set SURROGATE_PURGE_URL to the same address"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
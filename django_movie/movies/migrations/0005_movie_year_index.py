@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='year',
+            field=models.PositiveSmallIntegerField(db_index=True, default=2019, verbose_name='Дата выхода'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.0.4 on 2026-10-19 11:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counted = queryset.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(
+        count=Count("pk")).values("count")
+    return Coalesce(Subquery(counted), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Movie = apps.get_model("movies", "Movie")
+    Actor = apps.get_model("movies", "Actor")
+    Reviews = apps.get_model("movies", "Reviews")
+    MovieShots = apps.get_model("movies", "MovieShots")
+    Movie.objects.update(
+        reviews_count=count_of(Reviews.objects.all(), "movie"),
+        threads_count=count_of(Reviews.objects.filter(parent__isnull=True), "movie"),
+        shots_count=count_of(MovieShots.objects.all(), "movie"),
+    )
+    Actor.objects.update(
+        films_as_actor_count=count_of(Movie.actors.through.objects.all(), "actor"),
+        films_as_director_count=count_of(Movie.directors.through.objects.all(), "actor"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_bulkjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='films_as_actor_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Фильмов актёром'),
+        ),
+        migrations.AddField(
+            model_name='actor',
+            name='films_as_director_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Фильмов режиссёром'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Отзывов'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='shots_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кадров'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='threads_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Веток отзывов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
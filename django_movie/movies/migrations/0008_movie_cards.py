@@ -0,0 +1,88 @@
+# Generated by Django 4.0.4 on 2026-10-19 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, Count
+import django.db.models.deletion
+
+
+def translated(obj, field, code):
+    return getattr(obj, f"{field}_{code}", None) or getattr(obj, f"{field}_{settings.LANGUAGE_CODE}", None) or ""
+
+
+def fill_cards(apps, schema_editor):
+    """Cards with original posters, rebuild_cards replaces them with renditions"""
+    Movie = apps.get_model("movies", "Movie")
+    MovieCard = apps.get_model("movies", "MovieCard")
+    Rating = apps.get_model("movies", "Rating")
+    ratings = {
+        row["movie_id"]: row
+        for row in Rating.objects.order_by().values("movie_id").annotate(avg=Avg("star__value"), count=Count("id"))
+    }
+    cards = []
+    for movie in Movie.objects.filter(draft=False).prefetch_related("genres"):
+        genres = list(movie.genres.all())
+        rating = ratings.get(movie.pk, {"avg": None, "count": 0})
+        for code, _ in settings.LANGUAGES:
+            cards.append(MovieCard(
+                movie=movie,
+                language=code,
+                title=translated(movie, "title", code),
+                tagline=translated(movie, "tagline", code),
+                url=movie.url,
+                poster=movie.poster.name or "",
+                year=movie.year,
+                country=translated(movie, "country", code),
+                genres=", ".join(translated(genre, "name", code) for genre in genres),
+                genre_ids=",%s," % ",".join(str(genre.pk) for genre in genres),
+                rating_avg=rating["avg"],
+                rating_count=rating["count"],
+            ))
+    MovieCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10, verbose_name='Язык')),
+                ('title', models.CharField(max_length=100, verbose_name='название')),
+                ('tagline', models.CharField(blank=True, max_length=100, verbose_name='Слоган')),
+                ('url', models.SlugField(max_length=130)),
+                ('poster', models.ImageField(blank=True, max_length=255, upload_to='', verbose_name='Постер')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Дата выхода')),
+                ('country', models.CharField(blank=True, max_length=30, verbose_name='Страна')),
+                ('genres', models.CharField(blank=True, max_length=500, verbose_name='жанры')),
+                ('genre_ids', models.CharField(blank=True, help_text='id жанров через запятую: ,1,5,', max_length=255)),
+                ('rating_avg', models.FloatField(null=True, verbose_name='Средняя оценка')),
+                ('rating_count', models.PositiveIntegerField(default=0, verbose_name='Оценок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cards', to='movies.movie', verbose_name='фильм')),
+            ],
+            options={
+                'verbose_name': 'Карточка фильма',
+                'verbose_name_plural': 'Карточки фильмов',
+                'ordering': ['movie_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='moviecard',
+            index=models.Index(fields=['language', 'year'], name='movies_movi_languag_48f66a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviecard',
+            index=models.Index(fields=['language', 'updated_at'], name='movies_movi_languag_f185db_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moviecard',
+            unique_together={('language', 'movie')},
+        ),
+        migrations.RunPython(fill_cards, migrations.RunPython.noop),
+    ]
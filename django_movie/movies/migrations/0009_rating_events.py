@@ -0,0 +1,63 @@
+# Generated by Django 4.0.4 on 2026-10-19 11:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_movie_cards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RatingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('star', models.SmallIntegerField(null=True, verbose_name='Оценка')),
+                ('previous', models.SmallIntegerField(null=True, verbose_name='Предыдущая оценка')),
+                ('month', models.PositiveIntegerField(help_text='ГГГГММ, ключ архивации', verbose_name='Месяц')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создано')),
+                ('movie', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='movies.movie', verbose_name='фильм')),
+            ],
+            options={
+                'verbose_name': 'Событие рейтинга',
+                'verbose_name_plural': 'События рейтинга',
+            },
+        ),
+        migrations.CreateModel(
+            name='RatingDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('star', models.SmallIntegerField(verbose_name='Оценка')),
+                ('added', models.PositiveIntegerField(default=0, verbose_name='Добавлено')),
+                ('removed', models.PositiveIntegerField(default=0, verbose_name='Снято')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movies.movie', verbose_name='фильм')),
+            ],
+            options={
+                'verbose_name': 'Оценки за день',
+                'verbose_name_plural': 'Оценки по дням',
+                'ordering': ['-day', 'movie', '-star'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ratingevent',
+            index=models.Index(fields=['month', 'id'], name='movies_rati_month_68b43c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ratingdaily',
+            unique_together={('movie', 'day', 'star')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.4 on 2026-10-19 12:00
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_votes(apps, schema_editor):
+    """Keep the latest vote of each ip for a movie"""
+    Rating = apps.get_model("movies", "Rating")
+    duplicates = (
+        Rating.objects.order_by().values("ip", "movie_id")
+        .annotate(keep=Max("id"), votes=Count("id")).filter(votes__gt=1)
+    )
+    for row in duplicates:
+        Rating.objects.filter(ip=row["ip"], movie_id=row["movie_id"]).exclude(pk=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_rating_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_votes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='rating',
+            unique_together={('ip', 'movie')},
+        ),
+    ]
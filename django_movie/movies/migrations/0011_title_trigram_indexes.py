@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-19 12:02
+
+from django.db import migrations
+
+# Search and the admin filter titles with icontains, that is UPPER(title) LIKE UPPER('%q%')
+INDEXES = {
+    "movies_moviecard_title_trgm": ("movies_moviecard", "title"),
+    "movies_movie_title_ru_trgm": ("movies_movie", "title_ru"),
+    "movies_movie_title_en_trgm": ("movies_movie", "title_en"),
+}
+
+
+def has_trigram_extension(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """PostgreSQL only, and only where the pg_trgm extension is available"""
+    if schema_editor.connection.vendor != "postgresql" or not has_trigram_extension(schema_editor):
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin (UPPER("{column}") gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_rating_unique_ip_movie'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.4 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_title_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='budget',
+            field=models.PositiveBigIntegerField(default=0, help_text='указывать сумму в долларах', verbose_name='Бюджет'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='fees_in_usa',
+            field=models.PositiveBigIntegerField(default=0, help_text='указывать сумму в долларах', verbose_name='Сборы в США'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='fees_in_world',
+            field=models.PositiveBigIntegerField(default=0, help_text='указывать сумму в долларах', verbose_name='Сборы в мире'),
+        ),
+    ]
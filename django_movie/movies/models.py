@@ -1,6 +1,25 @@
 from django.urls import reverse
 from datetime import date
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+class CountedModel(models.Model):
+    """Model with counters kept by counters.py, which a save of a loaded instance leaves alone"""
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        if update_fields is None and not force_insert and not self._state.adding and self.pk is not None:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and field.name not in self.counter_fields
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+    class Meta:
+        abstract = True
 
 
 class Category(models.Model):
@@ -8,6 +27,7 @@ class Category(models.Model):
     name = models.CharField("Категория", max_length=150)
     description = models.TextField("Описание")
     url = models.SlugField(max_length=160, unique=True)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -17,12 +37,16 @@ class Category(models.Model):
         verbose_name_plural = "Категории"
 
 
-class Actor(models.Model):
+class Actor(CountedModel):
     """Actor and directors """
+    counter_fields = ("films_as_actor_count", "films_as_director_count")
     name = models.CharField("Имя", max_length=100)
     age = models.PositiveSmallIntegerField("Возраст", default=0)
     description = models.TextField("Описание")
     image = models.ImageField("Изображение", upload_to="actors/")
+    films_as_actor_count = models.PositiveIntegerField("Фильмов актёром", default=0, editable=False)
+    films_as_director_count = models.PositiveIntegerField("Фильмов режиссёром", default=0, editable=False)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -40,6 +64,7 @@ class Genre(models.Model):
     name = models.CharField("Имя", max_length=100)
     description = models.TextField("Описание")
     url = models.SlugField(max_length=160, unique=True)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -49,13 +74,14 @@ class Genre(models.Model):
         verbose_name_plural = "Жанры"
 
 
-class Movie(models.Model):
+class Movie(CountedModel):
     """Movies"""
+    counter_fields = ("reviews_count", "threads_count", "shots_count")
     title = models.CharField("название", max_length=100)
     tagline = models.CharField("Слоган", max_length=100, default='')
     description = models.TextField("Описание")
     poster = models.ImageField("Постер", upload_to='movies/')
-    year = models.PositiveSmallIntegerField("Дата выхода", default=2019)
+    year = models.PositiveSmallIntegerField("Дата выхода", default=2019, db_index=True)
     country = models.CharField("Страна", max_length=30)
     directors = models.ManyToManyField(
         Actor, verbose_name="режиссёр", related_name='film_director')
@@ -63,12 +89,12 @@ class Movie(models.Model):
         Actor, verbose_name="акёры", related_name='film_actor')
     genres = models.ManyToManyField(Genre, verbose_name="жанры")
     world_premier = models.DateField("Примьера в мире", default=date.today)
-    budget = models.PositiveSmallIntegerField(
+    budget = models.PositiveBigIntegerField(
         "Бюджет", default=0, help_text="указывать сумму в долларах")
-    fees_in_usa = models.PositiveSmallIntegerField(
+    fees_in_usa = models.PositiveBigIntegerField(
         "Сборы в США", default=0, help_text='указывать сумму в долларах'
     )
-    fees_in_world = models.PositiveSmallIntegerField(
+    fees_in_world = models.PositiveBigIntegerField(
         "Сборы в мире", default=0, help_text='указывать сумму в долларах'
     )
     category = models.ForeignKey(
@@ -76,6 +102,10 @@ class Movie(models.Model):
     )
     url = models.SlugField(max_length=130, unique=True)
     draft = models.BooleanField("Черновик", default=False)
+    reviews_count = models.PositiveIntegerField("Отзывов", default=0, editable=False)
+    threads_count = models.PositiveIntegerField("Веток отзывов", default=0, editable=False)
+    shots_count = models.PositiveIntegerField("Кадров", default=0, editable=False)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -99,6 +129,7 @@ class MovieShots(models.Model):
     image = models.ImageField("Изображение", upload_to='movie_shots/')
     movie = models.ForeignKey(
         Movie, verbose_name='Фильм', on_delete=models.CASCADE)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -130,9 +161,60 @@ class Rating(models.Model):
     def __str__(self):
         return f"{self.star} - {self.movie}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_star_id = instance.__dict__.get("star_id")
+        return instance
+
     class Meta:
         verbose_name = "Рейтинг"
         verbose_name_plural = "Рейтинги"
+        unique_together = [("ip", "movie")]
+
+
+class RatingEvent(models.Model):
+    """Append-only log of vote changes, star is None when a vote is removed"""
+    movie = models.ForeignKey(
+        Movie, verbose_name="фильм", on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    star = models.SmallIntegerField("Оценка", null=True)
+    previous = models.SmallIntegerField("Предыдущая оценка", null=True)
+    month = models.PositiveIntegerField("Месяц", help_text="ГГГГММ, ключ архивации")
+    created_at = models.DateTimeField("Создано", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Событие рейтинга"
+        verbose_name_plural = "События рейтинга"
+        indexes = [models.Index(fields=["month", "id"])]
+
+
+class RatingDaily(models.Model):
+    """Votes given to and taken from a star of a movie during a day"""
+    movie = models.ForeignKey(Movie, verbose_name="фильм", on_delete=models.CASCADE)
+    day = models.DateField("День")
+    star = models.SmallIntegerField("Оценка")
+    added = models.PositiveIntegerField("Добавлено", default=0)
+    removed = models.PositiveIntegerField("Снято", default=0)
+
+    def __str__(self):
+        return f"{self.movie_id} {self.day} {self.star}"
+
+    class Meta:
+        verbose_name = "Оценки за день"
+        verbose_name_plural = "Оценки по дням"
+        unique_together = [("movie", "day", "star")]
+        ordering = ["-day", "movie", "-star"]
+
+
+class RollupMark(models.Model):
+    """Last event id aggregated by a rollup, or last version of a change log"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
 
 
 class Reviews(models.Model):
@@ -145,6 +227,7 @@ class Reviews(models.Model):
     )
     movie = models.ForeignKey(
         Movie, verbose_name="фильм", on_delete=models.CASCADE)
+    updated_at = models.DateTimeField("Изменено", auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.name} - {self.movie}"
@@ -152,3 +235,74 @@ class Reviews(models.Model):
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+
+
+class MovieCard(models.Model):
+    """Published movie as shown in listings, one row per language"""
+    movie = models.ForeignKey(Movie, verbose_name="фильм", on_delete=models.CASCADE, related_name="cards")
+    language = models.CharField("Язык", max_length=10)
+    title = models.CharField("название", max_length=100)
+    tagline = models.CharField("Слоган", max_length=100, blank=True)
+    url = models.SlugField(max_length=130)
+    poster = models.ImageField("Постер", max_length=255, blank=True)
+    year = models.PositiveSmallIntegerField("Дата выхода")
+    country = models.CharField("Страна", max_length=30, blank=True)
+    genres = models.CharField("жанры", max_length=500, blank=True)
+    genre_ids = models.CharField(max_length=255, blank=True, help_text="id жанров через запятую: ,1,5,")
+    rating_avg = models.FloatField("Средняя оценка", null=True)
+    rating_count = models.PositiveIntegerField("Оценок", default=0)
+    updated_at = models.DateTimeField("Изменено", auto_now=True)
+
+    def __str__(self):
+        return f"{self.title} ({self.language})"
+
+    def get_absolute_url(self):
+        return reverse("movie_detail", kwargs={"slug": self.url})
+
+    class Meta:
+        verbose_name = "Карточка фильма"
+        verbose_name_plural = "Карточки фильмов"
+        ordering = ["movie_id"]
+        unique_together = [("language", "movie")]
+        indexes = [
+            models.Index(fields=["language", "year"]),
+            models.Index(fields=["language", "updated_at"]),
+        ]
+
+
+class BulkJob(models.Model):
+    """Bulk admin action executed in the background"""
+    ACTIONS = (
+        ("publish", "Опубликовать"),
+        ("unpublish", "Снять с публикации"),
+        ("delete", "Удалить"),
+        ("recategorize", "Сменить категорию"),
+    )
+    STATUSES = (
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Готово"),
+        ("failed", "Ошибка"),
+    )
+    action = models.CharField("Действие", max_length=20, choices=ACTIONS)
+    object_ids = models.JSONField("Объекты", default=list)
+    params = models.JSONField("Параметры", default=dict, blank=True)
+    status = models.CharField("Статус", max_length=10, choices=STATUSES, default="pending", db_index=True)
+    total = models.PositiveIntegerField("Всего", default=0)
+    processed = models.PositiveIntegerField("Обработано", default=0)
+    error = models.TextField("Ошибка", blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, verbose_name="Пользователь", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField("Создано", auto_now_add=True)
+    started_at = models.DateTimeField("Начато", null=True, blank=True)
+    heartbeat_at = models.DateTimeField("Последний отчёт", null=True, blank=True)
+    finished_at = models.DateTimeField("Завершено", null=True, blank=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_action_display()}"
+
+    class Meta:
+        verbose_name = "Фоновое задание"
+        verbose_name_plural = "Фоновые задания"
+        ordering = ["-id"]
@@ -0,0 +1,40 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Row count of an unfiltered queryset from the table statistics, or None"""
+    if queryset.query.has_filters() or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql, params = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table]
+    elif connection.vendor == "sqlite":
+        # filled by ANALYZE, the first number of any row is the table size
+        sql, params = "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that does not COUNT(*) big unfiltered tables"""
+    exact_count_threshold = 100000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
@@ -0,0 +1,136 @@
+"""Static export of the public catalog
+
+Every public page is requested through the normal URL conf, views and
+templates as an anonymous visitor and written under PRERENDER_ROOT, so
+that nginx can serve it without Python. Each page has a fingerprint of
+the rows it renders: the header and sidebar shared by every page plus its
+own movie, actor, cards or flat page. Fingerprints are kept in a manifest
+and only pages whose fingerprint changed are rendered again, so a vote
+or a review re-renders nothing or one movie page rather than the catalog.
+
+Rendered forms carry no CSRF token; a script appended to every page
+fills them from the csrf_token endpoint, which also sets the cookie.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import translation
+
+from django_movie.flatpages import build_map
+from django_movie.views import strip_csrf
+
+from .cards import cards
+from .filmography import filmography
+from .models import Actor, Category, Genre, Movie, RatingStar
+from .views import ActorView, MoviesView
+
+MANIFEST = "manifest.json"
+
+
+def fingerprint(*parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def paginated(url, count, per_page):
+    """(url, offset) of every page"""
+    yield url, 0
+    for number in range(2, math.ceil(count / per_page) + 1):
+        yield f"{url}?page={number}", (number - 1) * per_page
+
+
+def shared_state(language):
+    """Rows of the header and sidebar of every page"""
+    return (
+        list(Category.objects.values_list("pk", "updated_at")),
+        list(Genre.objects.values_list("pk", "updated_at")),
+        list(Movie.objects.filter(draft=False).values_list("year", flat=True)),
+        list(cards(language).values_list("movie_id", "title", "poster", "url")[:3]),
+    )
+
+
+def public_pages():
+    """[(url, fingerprint)] of every pre-rendered page in every language"""
+    pages = []
+    site_map = build_map(settings.SITE_ID)
+    flatpages = {page[0]: page for page in FlatPage.objects.values_list(
+        "pk", "title", "content", "template_name", "registration_required")}
+    stars = list(RatingStar.objects.values_list("pk", "value"))
+    for code, _ in settings.LANGUAGES:
+        shared = shared_state(code)
+        with translation.override(code):
+            per_page = MoviesView.paginate_by
+            for url, offset in paginated(reverse("movie_list"), cards(code).count(), per_page):
+                shown = cards(code).values_list("movie_id", "title", "tagline", "poster", "url")
+                pages.append((url, fingerprint(shared, list(shown[offset:offset + per_page]))))
+            for slug, updated_at in Movie.objects.filter(draft=False).values_list("url", "updated_at"):
+                pages.append((reverse("movie_detail", kwargs={"slug": slug}), fingerprint(shared, updated_at, stars)))
+            per_page = ActorView.filmography_per_page
+            for actor in Actor.objects.values_list(
+                    "pk", "name", "updated_at", "films_as_actor_count", "films_as_director_count"):
+                films = filmography(actor[0], code)
+                count = films.count() if actor[3] + actor[4] > per_page else actor[3] + actor[4]
+                for url, offset in paginated(reverse("actor_detail", kwargs={"slug": actor[1]}), count, per_page):
+                    shown = films.values_list("movie_id", "title", "url", "year", "acted", "directed")
+                    pages.append((url, fingerprint(shared, actor, list(shown[offset:offset + per_page]))))
+            for path, pk in site_map.get(code, {}).items():
+                pages.append((f"/{code}{path}", fingerprint(shared, flatpages[pk])))
+    return pages
+
+
+def output_path(root, url):
+    """File for a url: <path>/index.html, <path>/page-<n>.html for ?page=n"""
+    parts = urlsplit(url)
+    directory = os.path.join(root, *[part for part in unquote(parts.path).split("/") if part])
+    page = re.fullmatch(r"page=(\d+)", parts.query)
+    return os.path.join(directory, f"page-{page.group(1)}.html" if page else "index.html")
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp, path)
+
+
+def render_pages(root, urls):
+    """Render urls, returns [(url, status)]"""
+    host = settings.PRERENDER_HOST
+    results = []
+    with override_settings(ALLOWED_HOSTS=[host]):
+        client = Client(HTTP_HOST=host)
+        for url in urls:
+            response = client.get(url)
+            if response.status_code == 200:
+                write_atomic(output_path(root, url), strip_csrf(response.content.decode(response.charset)))
+            results.append((url, response.status_code))
+    return results
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(root, manifest):
+    write_atomic(os.path.join(root, MANIFEST), json.dumps(manifest, ensure_ascii=False, indent=1))
+
+
+def remove_stale(root, urls):
+    """Delete the files of urls that are no longer public"""
+    for url in urls:
+        try:
+            os.remove(output_path(root, url))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,153 @@
+"""Rating event log and daily rollups
+
+Every vote change appends a RatingEvent. `rollup` aggregates events
+past the RollupMark high-water mark into RatingDaily histograms with
+grouped queries over id ranges, so the cost depends on the number of new
+events only and the live Rating table is never read. Events carry their
+month (YYYYMM), the unit `archive_month` exports and deletes once it is
+rolled up.
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from django_movie.cache import get_or_compute
+
+from .models import Movie, Rating, RatingDaily, RatingEvent, RatingStar, RollupMark
+
+ROLLUP = "rating_daily"
+UPSERT_SQL = """
+WITH previous AS (SELECT star_id FROM {table} WHERE ip = %s AND movie_id = %s)
+INSERT INTO {table} (ip, movie_id, star_id) VALUES (%s, %s, %s)
+ON CONFLICT (ip, movie_id) DO UPDATE SET star_id = EXCLUDED.star_id
+RETURNING id, (SELECT star_id FROM previous)
+"""
+
+
+def star_values():
+    return get_or_compute("movies", "rating_stars", lambda: dict(RatingStar.objects.values_list("pk", "value")))
+
+
+def log_vote(movie_id, star_id, previous_star_id):
+    """Append the change of one vote, ids of None mean no vote"""
+    values = star_values()
+    now = timezone.now()
+    RatingEvent.objects.create(
+        movie_id=movie_id,
+        star=values.get(star_id),
+        previous=values.get(previous_star_id),
+        month=now.year * 100 + now.month,
+        created_at=now,
+    )
+
+
+def save_rating(ip, movie_id, star_id):
+    """Set the vote of ip for a movie, a single upsert on PostgreSQL
+
+    post_save is sent as for Rating.save(), so the card and the event log
+    are updated either way.
+    """
+    if connection.vendor != "postgresql":
+        Rating.objects.update_or_create(ip=ip, movie_id=movie_id, defaults={"star_id": star_id})
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(table=connection.ops.quote_name(Rating._meta.db_table)),
+            [ip, movie_id, ip, movie_id, star_id],
+        )
+        pk, previous = cursor.fetchone()
+    rating = Rating(pk=pk, ip=ip, movie_id=movie_id, star_id=star_id)
+    rating._loaded_star_id = previous
+    post_save.send(
+        sender=Rating, instance=rating, created=previous is None, update_fields=None, raw=False, using=connection.alias
+    )
+
+
+def grouped(events, field):
+    """{(movie_id, day, star): count} of events by their star or previous star"""
+    rows = (
+        events.filter(**{f"{field}__isnull": False})
+        .annotate(day=TruncDate("created_at"))
+        .order_by()
+        .values_list("movie_id", "day", field)
+        .annotate(count=Count("id"))
+    )
+    return {(movie_id, day, star): count for movie_id, day, star, count in rows}
+
+
+def apply_counts(added, removed):
+    keys = set(added) | set(removed)
+    movie_ids = set(Movie.objects.filter(pk__in={key[0] for key in keys}).values_list("pk", flat=True))
+    keys = {key for key in keys if key[0] in movie_ids}
+    days = {key[1] for key in keys}
+    existing = {
+        (row.movie_id, row.day, row.star): row
+        for row in RatingDaily.objects.filter(movie_id__in=movie_ids, day__in=days)
+    }
+    updated, created = [], []
+    for key in keys:
+        row = existing.get(key)
+        if row is None:
+            row = RatingDaily(movie_id=key[0], day=key[1], star=key[2])
+            created.append(row)
+        else:
+            updated.append(row)
+        row.added += added.get(key, 0)
+        row.removed += removed.get(key, 0)
+    RatingDaily.objects.bulk_update(updated, ["added", "removed"], batch_size=1000)
+    RatingDaily.objects.bulk_create(created, batch_size=1000)
+
+
+def rollup(batch_size=None, lag=None):
+    """Aggregate new events into RatingDaily, returns the number of events"""
+    batch_size = batch_size or settings.RATING_ROLLUP_BATCH
+    lag = settings.RATING_ROLLUP_LAG if lag is None else lag
+    # Events of transactions still open may get lower ids than committed
+    # ones, so the newest seconds are left for the next run.
+    upper = RatingEvent.objects.filter(
+        created_at__lte=timezone.now() - timedelta(seconds=lag)
+    ).order_by("-id").values_list("id", flat=True).first()
+    total = 0
+    while upper:
+        with transaction.atomic():
+            mark, _ = RollupMark.objects.select_for_update().get_or_create(name=ROLLUP)
+            if mark.last_id >= upper:
+                break
+            end = min(mark.last_id + batch_size, upper)
+            events = RatingEvent.objects.filter(id__gt=mark.last_id, id__lte=end)
+            added, removed = grouped(events, "star"), grouped(events, "previous")
+            apply_counts(added, removed)
+            total += events.count()
+            mark.last_id = end
+            mark.save(update_fields=["last_id", "updated_at"])
+    return total
+
+
+def archive_month(month, directory=None):
+    """Export a rolled up month of events to gzipped JSON lines and delete it"""
+    directory = directory or settings.RATING_ARCHIVE_DIR
+    events = RatingEvent.objects.filter(month=month).order_by("id")
+    last = events.aggregate(id=Max("id"))["id"]
+    if last is None:
+        return None, 0
+    mark = RollupMark.objects.filter(name=ROLLUP).values_list("last_id", flat=True).first() or 0
+    if last > mark:
+        raise ValueError(f"Events of {month} are not rolled up yet")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"rating_events_{month}.jsonl.gz")
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for row in events.values("id", "movie_id", "star", "previous", "created_at").iterator(chunk_size=10000):
+            row["created_at"] = row["created_at"].isoformat()
+            f.write(json.dumps(row) + "\n")
+            count += 1
+    RatingEvent.objects.filter(month=month, id__lte=last).delete()
+    return path, count
@@ -0,0 +1,331 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from django_movie import cache, surrogate
+from django_movie.surrogate import CATALOG, MOVIE_LIST, object_keys
+
+from . import autocomplete
+from .cards import refresh_card_ratings, refresh_cards
+from .counters import adjust_movies, child_counts, refresh_actors
+from .models import Actor, Category, Genre, Movie, MovieShots, Rating, RatingStar, Reviews
+from .ratings import log_vote
+from .uploads import rendition_for, rewrite_images
+
+# Sent after a chunk of a bulk job is committed, with sender=Movie,
+# action and the list of pks, in place of per-object save signals.
+bulk_changed = Signal()
+
+M2M_CHANGED = ("post_add", "post_remove", "post_clear")
+
+
+def bump_objects(namespace):
+    """Now and again on commit, a worker may load the old row in between"""
+    cache.bump(namespace)
+    transaction.on_commit(lambda: cache.bump(namespace))
+
+
+def touch_movies(**filters):
+    """Bump updated_at of movies whose page shows a changed object"""
+    Movie.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Reviews)
+@receiver(pre_save, sender=MovieShots)
+def remember_movie_of_child(sender, instance, **kwargs):
+    if instance.pk:
+        fields = ("movie_id", "parent_id") if sender is Reviews else ("movie_id",)
+        old = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+        instance._old_movie_id = old.get("movie_id")
+        instance._old_parent_id = old.get("parent_id")
+
+
+@receiver(post_save, sender=Reviews)
+@receiver(post_save, sender=MovieShots)
+def count_saved_child(sender, instance, created, **kwargs):
+    """A review or still changes its movie's page and counters"""
+    deltas = defaultdict(Counter)
+    if not created:
+        deltas[instance._old_movie_id].update(child_counts(sender, instance._old_parent_id, -1))
+    deltas[instance.movie_id].update(child_counts(sender, getattr(instance, "parent_id", None), 1))
+    adjust_movies(deltas)
+
+
+@receiver(pre_delete, sender=Reviews)
+def remember_replies(sender, instance, **kwargs):
+    """Replies of a deleted review become threads (parent is SET_NULL)"""
+    instance._reply_ids = list(sender.objects.filter(parent=instance).values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Reviews)
+@receiver(post_delete, sender=MovieShots)
+def count_deleted_child(sender, instance, **kwargs):
+    deltas = defaultdict(Counter)
+    deltas[instance.movie_id].update(child_counts(sender, getattr(instance, "parent_id", None), -1))
+    # Replies deleted along with their parent are gone by now
+    reply_ids = getattr(instance, "_reply_ids", None)
+    if reply_ids:
+        for movie_id in Reviews.objects.filter(pk__in=reply_ids).values_list("movie_id", flat=True):
+            deltas[movie_id]["threads_count"] += 1
+    adjust_movies(deltas)
+
+
+@receiver(post_save, sender=Actor)
+def touch_movies_of_actor(sender, instance, created, **kwargs):
+    if not created:
+        touch_movies(pk__in=Movie.objects.filter(
+            Q(actors=instance) | Q(directors=instance)).values("pk"))
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+def refresh_actor_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_actors([instance.pk])
+    elif action == "pre_clear":
+        instance._cleared_actor_ids = list(sender.objects.filter(movie=instance).values_list("actor_id", flat=True))
+    elif action == "post_clear":
+        refresh_actors(instance._cleared_actor_ids)
+    elif action in ("post_add", "post_remove"):
+        refresh_actors(pk_set)
+
+
+@receiver(pre_delete, sender=Movie)
+def remember_cast(sender, instance, **kwargs):
+    instance._cast_ids = set(instance.actors.values_list("pk", flat=True)) | set(
+        instance.directors.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Movie)
+def refresh_cast_counters(sender, instance, **kwargs):
+    refresh_actors(instance._cast_ids)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def touch_movies_of_relation(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        touch_movies(pk__in=sender.objects.filter(
+            **{instance._meta.model_name: instance}).values("movie_id"))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            touch_movies(pk=instance.pk)
+        elif pk_set:
+            touch_movies(pk__in=pk_set)
+
+
+@receiver(pre_save, sender=Movie)
+@receiver(pre_save, sender=Actor)
+def use_optimized_images(sender, instance, **kwargs):
+    for code, _ in settings.LANGUAGES:
+        field = f"description_{code}"
+        setattr(instance, field, rewrite_images(
+            getattr(instance, field), lambda path: rendition_for(default_storage, path)))
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+def update_autocomplete(sender, instance, **kwargs):
+    autocomplete.changed(autocomplete.MOVIE if sender is Movie else autocomplete.ACTOR, [instance.pk])
+
+
+@receiver(bulk_changed, sender=Movie)
+def update_autocomplete_in_bulk(sender, pks, **kwargs):
+    autocomplete.changed(autocomplete.MOVIE, pks)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=RatingStar)
+@receiver(post_delete, sender=RatingStar)
+@receiver(bulk_changed, sender=Movie)
+def invalidate_movies_cache(sender, **kwargs):
+    """Sidebar and header lists are cached in the "movies" namespace"""
+    cache.bump("movies")
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=MovieShots)
+@receiver(post_delete, sender=MovieShots)
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+@receiver(m2m_changed, sender=Movie.genres.through)
+def invalidate_movie_objects(sender, action=None, **kwargs):
+    """Hot movies carry their cast, genres, stills and counters updated with update()"""
+    if action is None or action in M2M_CHANGED:
+        bump_objects("movie_objects")
+
+
+@receiver(bulk_changed, sender=Movie)
+def invalidate_movie_objects_in_bulk(sender, **kwargs):
+    bump_objects("movie_objects")
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+@receiver(post_delete, sender=Movie)
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+def invalidate_actor_objects(sender, action=None, **kwargs):
+    """Hot actors carry filmography counters updated with update()"""
+    if action is None or action in M2M_CHANGED:
+        bump_objects("actor_objects")
+
+
+@receiver(post_save, sender=Movie)
+def refresh_movie_card(sender, instance, **kwargs):
+    refresh_cards([instance.pk])
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def refresh_rated_movie_card(sender, instance, **kwargs):
+    refresh_card_ratings(instance.movie_id)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def refresh_cards_of_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        instance._card_movie_ids = list(sender.objects.filter(genre=instance).values_list("movie_id", flat=True))
+    elif action == "post_clear" and reverse:
+        refresh_cards(instance._card_movie_ids)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        refresh_cards(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Genre)
+def refresh_cards_of_genre(sender, instance, created, **kwargs):
+    if not created:
+        refresh_cards(instance.movie_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Genre)
+def remember_movies_of_genre(sender, instance, **kwargs):
+    instance._card_movie_ids = list(instance.movie_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Genre)
+def refresh_cards_of_deleted_genre(sender, instance, **kwargs):
+    refresh_cards(instance._card_movie_ids)
+
+
+@receiver(bulk_changed, sender=Movie)
+def refresh_cards_in_bulk(sender, pks, **kwargs):
+    refresh_cards(pks)
+
+
+@receiver(post_save, sender=Rating)
+def log_rating_change(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_loaded_star_id", None)
+    if created or previous != instance.star_id:
+        log_vote(instance.movie_id, instance.star_id, previous)
+    instance._loaded_star_id = instance.star_id
+
+
+@receiver(post_delete, sender=Rating)
+def log_rating_removal(sender, instance, **kwargs):
+    log_vote(instance.movie_id, None, instance.star_id)
+
+
+@receiver(pre_save, sender=Movie)
+def remember_listed_fields(sender, instance, **kwargs):
+    if surrogate.enabled() and instance.pk:
+        instance._listed_fields = sender.objects.filter(pk=instance.pk).values_list(
+            "year", "draft", "category_id").first()
+
+
+@receiver(post_save, sender=Movie)
+def purge_movie(sender, instance, created, **kwargs):
+    """Listings change only when a movie appears, disappears or moves"""
+    keys = [f"movie-{instance.pk}"]
+    if created or getattr(instance, "_listed_fields", None) != (instance.year, instance.draft, instance.category_id):
+        keys += [MOVIE_LIST, CATALOG]
+    surrogate.purge(*keys)
+
+
+@receiver(post_delete, sender=Movie)
+def purge_deleted_movie(sender, instance, **kwargs):
+    surrogate.purge(f"movie-{instance.pk}", MOVIE_LIST, CATALOG, *object_keys("actor", instance._cast_ids))
+
+
+@receiver(bulk_changed, sender=Movie)
+def purge_movies_in_bulk(sender, pks, **kwargs):
+    surrogate.purge(MOVIE_LIST, CATALOG, *object_keys("movie", pks))
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+def purge_actor(sender, instance, created=False, **kwargs):
+    if not created:
+        surrogate.purge(f"actor-{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+@receiver(m2m_changed, sender=Movie.directors.through)
+def purge_cast(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        keys = [f"actor-{instance.pk}"] + object_keys("movie", pk_set or ())
+    else:
+        keys = [f"movie-{instance.pk}"] + object_keys(
+            "actor", pk_set or getattr(instance, "_cleared_actor_ids", ()))
+    if reverse and action == "post_clear":
+        keys.append(CATALOG)
+    surrogate.purge(*keys)
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+def purge_genres_of_movie(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    keys = [MOVIE_LIST] + (object_keys("movie", pk_set or ()) if reverse else [f"movie-{instance.pk}"])
+    if reverse and action == "post_clear":
+        keys.append(CATALOG)
+    surrogate.purge(*keys)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_catalog(sender, **kwargs):
+    """Genre and category names are in the sidebar, header and cards"""
+    surrogate.purge(CATALOG)
+
+
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+def purge_movie_of_review(sender, instance, **kwargs):
+    old_movie_id = getattr(instance, "_old_movie_id", None) or instance.movie_id
+    surrogate.purge(*object_keys("movie", {instance.movie_id, old_movie_id}))
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def purge_rating(sender, instance, **kwargs):
+    """Only responses with rating summaries carry "rating-<pk>", pages do not change on a vote"""
+    surrogate.purge(f"rating-{instance.movie_id}")
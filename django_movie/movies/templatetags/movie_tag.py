@@ -1,5 +1,9 @@
 from django import template
-from movies.models import Category, Movie
+from django.utils import translation
+from django_movie.cache import get_or_compute
+from django_movie.surrogate import add_keys, object_keys
+from movies.cards import cards
+from movies.models import Category
 
 register = template.Library()
 
@@ -7,11 +11,13 @@ register = template.Library()
 @register.simple_tag()
 def get_categories():
     """Show all categories"""
-    return Category.objects.all()
+    return get_or_compute("movies", "categories", lambda: list(Category.objects.all()))
 
 
-@register.inclusion_tag('movies/tags/last_movie.html')
-def get_last_movies(count=5):
-    movies = Movie.objects.order_by("id")[:count]
+@register.inclusion_tag('movies/tags/last_movie.html', takes_context=True)
+def get_last_movies(context, count=5):
+    language = translation.get_language()
+    movies = get_or_compute("movies", f"last_movies:{language}:{count}", lambda: list(cards(language)[:count]))
+    add_keys(context.get("request"), *object_keys("movie", [card.movie_id for card in movies]))
     return {"last_movie": movies}
 
@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+import zlib
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import django
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.flatpages.models import FlatPage
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone, translation
+from django.utils.text import slugify
+from PIL import Image
+
+from django_movie import cache, compression
+from django_movie.cache import bump
+from django_movie.db import check_connections
+from django_movie.middleware import StaticFilesMiddleware, parse_accept_encoding
+from django_movie.profiling import make_token
+from django_movie.ratelimit import get_client_ip, take_tokens
+from django_movie.stub_proxy import StubProxy
+from django_movie.views import parse_range, serve_media
+from django_movie.warmup import STEPS, warm_up
+
+from . import autocomplete
+from .autocomplete import ACTOR, MOVIE, PrefixIndex
+from . import bulk
+from .batch import NESTED_FIELDS
+from .cards import cards, filter_cards
+from .counters import refresh_movies
+from .filmography import filmographies
+from .prerender import public_pages
+from .ratings import rollup, save_rating
+from .hot_objects import movie_by_pk
+from .management.commands.startup_profile import parse_importtime
+from .models import (
+    Actor, BulkJob, Category, Genre, Movie, MovieShots, Rating, RatingDaily, RatingEvent, RatingStar, Reviews,
+)
+from .signals import bulk_changed
+from .uploads import OptimizingImageBackend
+
+
+def create_category():
+    return Category.objects.create(name="Фильмы", description="", url="films")
+
+
+def create_actor(name="Actor"):
+    return Actor.objects.create(name=name, description="", image=f"actors/{slugify(name)}.jpg")
+
+
+def create_movie(title="Terminator", **fields):
+    """Published movie, the url is the slug of the title unless given"""
+    fields = {"description": "", "poster": "movies/poster.jpg", "year": 1984, "country": "USA",
+              "url": slugify(title), **fields}
+    return Movie.objects.create(title=title, **fields)
+
+
+class CatalogTestCase(TestCase):
+    """Terminator in a category with one actor"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category()
+        cls.actor = create_actor()
+        cls.movie = create_movie(category=cls.category)
+        cls.movie.actors.add(cls.actor)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class SessionFreeBrowsingTest(CatalogTestCase):
+    """Anonymous catalog browsing must not read or write django_session"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.movie.genres.add(Genre.objects.create(name="Боевик", description="", url="action"))
+        cls.movie.directors.add(cls.actor)
+
+    def catalog_urls(self):
+        return [
+            "/ru/",
+            "/en/",
+            self.movie.get_absolute_url(),
+            self.actor.get_absolute_url(),
+            "/ru/filter/?year=1984",
+            "/ru/json-filter/?genre=1",
+            "/ru/search/?q=Term",
+            "/ru/autocomplete/?q=te",
+            f"/ru/batch/?ids={self.movie.pk}&fields=title,actors",
+        ]
+
+    def session_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response, [q["sql"] for q in queries.captured_queries if "django_session" in q["sql"]]
+
+    def test_anonymous_browsing_makes_no_session_queries(self):
+        for url in self.catalog_urls():
+            response, queries = self.session_queries(url)
+            self.assertEqual(queries, [], url)
+            self.assertNotIn("sessionid", response.cookies, url)
+
+    def test_logged_in_session_is_read_from_cache(self):
+        self.client.force_login(User.objects.create_user("user", password="password"))
+        self.client.get("/ru/")
+        for url in self.catalog_urls():
+            response, queries = self.session_queries(url)
+            self.assertEqual(queries, [], url)
+
+
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    SURROGATE_MAX_AGE=600,
+)
+class SurrogateKeysTest(CatalogTestCase):
+    """Pages name the objects they show and changes purge those names"""
+
+    def setUp(self):
+        self.proxy = StubProxy(("127.0.0.1", 0), "http://127.0.0.1:1")
+        threading.Thread(target=self.proxy.serve_forever, daemon=True).start()
+        self.addCleanup(self.proxy.server_close)
+        self.addCleanup(self.proxy.shutdown)
+        purge_url = f"http://127.0.0.1:{self.proxy.server_address[1]}/"
+        self.enterContext(override_settings(SURROGATE_PURGE_URL=purge_url))
+
+    def test_movie_page_is_shared_without_csrf_token(self):
+        response = self.client.get(self.movie.get_absolute_url())
+        keys = response["Surrogate-Key"].split()
+        self.assertIn(f"movie-{self.movie.pk}", keys)
+        self.assertIn(f"actor-{self.actor.pk}", keys)
+        self.assertIn("catalog", keys)
+        self.assertIn("s-maxage=600", response["Cache-Control"])
+        self.assertNotIn("csrftoken", response.cookies)
+        self.assertContains(response, 'name="csrfmiddlewaretoken" value=""')
+
+    def test_actor_rename_purges_pages_showing_the_actor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.actor.name = "Renamed"
+            self.actor.save()
+        self.assertEqual(self.proxy.purged, [[f"actor-{self.actor.pk}"]])
+
+    def test_vote_purges_only_responses_with_ratings(self):
+        response = self.client.get(f"/ru/batch/?ids={self.movie.pk}&fields=title,rating")
+        self.assertIn(f"rating-{self.movie.pk}", response["Surrogate-Key"].split())
+        response = self.client.get("/ru/json-filter/?year=1984")
+        self.assertIn(f"rating-{self.movie.pk}", response["Surrogate-Key"].split())
+        self.assertNotIn("movie_id", response.json()["movies"][0])
+        response = self.client.get(self.movie.get_absolute_url())
+        self.assertNotIn(f"rating-{self.movie.pk}", response["Surrogate-Key"].split())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(ip="10.0.0.1", star=RatingStar.objects.create(value=5), movie=self.movie)
+        self.assertEqual(self.proxy.purged, [[f"rating-{self.movie.pk}"]])
+
+    def test_purges_of_one_transaction_are_sent_together(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movie.title = "The Terminator"
+            self.movie.save()
+            self.movie.actors.clear()
+        self.assertEqual(self.proxy.purged, [[f"actor-{self.actor.pk}", f"movie-{self.movie.pk}"]])
+
+
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage",
+    ADMISSION_EXPENSIVE_IN_FLIGHT=0,
+)
+class AdmissionControlTest(TestCase):
+    """With no room for expensive requests only they are shed"""
+
+    def test_expensive_requests_are_shed(self):
+        for url in ("/ru/filter/?year=1984", "/ru/search/?q=Term", "/ru/?page=50"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 503, url)
+            self.assertEqual(response["Retry-After"], "5", url)
+
+    def test_validators_do_not_bypass_shedding(self):
+        for url in ("/ru/filter/?genre=*", "/ru/search/?q=a", "/ru/batch/?ids=x"):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"junk"')
+            self.assertEqual(response.status_code, 503, url)
+
+    def test_cheap_pages_and_writes_keep_flowing(self):
+        self.assertEqual(self.client.get("/ru/").status_code, 200)
+        self.assertNotEqual(self.client.post("/ru/add-rating/").status_code, 503)
+
+
+class NamespaceVersionTest(SimpleTestCase):
+    """Namespace versions survive culling and are never reused"""
+
+    def test_culling_the_shared_cache_keeps_versions(self):
+        version = bump("movies")
+        cache.get_cache().clear()
+        self.assertEqual(cache.namespace_version("movies"), version)
+
+    def test_lost_version_is_not_reused(self):
+        cache.get_versions_cache().delete("ns:movies")
+        for _ in range(1000):
+            used = bump("movies")
+        cache.get_versions_cache().delete("ns:movies")
+        self.assertGreater(cache.namespace_version("movies"), used)
+
+
+class PrefixIndexTest(SimpleTestCase):
+    """Typeahead matches word prefixes, best scored first"""
+
+    def setUp(self):
+        self.index = PrefixIndex("ru")
+        self.index.add(MOVIE, 1, "Terminator 2", "/ru/terminator-2/", 5)
+        self.index.add(MOVIE, 2, "The Terminal", "/ru/terminal/", 9)
+        self.index.add(ACTOR, 1, "Арнольд Шварценеггер", "/ru/actor/arnold/", 3)
+
+    def labels(self, text, limit=10):
+        return [result["label"] for result in self.index.search(text, limit)]
+
+    def test_search(self):
+        self.assertEqual(self.labels("termin"), ["The Terminal", "Terminator 2"])
+        self.assertEqual(self.labels("TERMIN", limit=1), ["The Terminal"])
+        self.assertEqual(self.labels("2"), ["Terminator 2"])
+        self.assertEqual(self.labels("шварц"), ["Арнольд Шварценеггер"])
+        self.assertEqual(self.labels("te"), ["The Terminal", "Terminator 2"])
+        self.assertEqual(self.labels(" "), [])
+        self.assertEqual(self.index.search("шварц")[0]["kind"], "actor")
+
+    def test_add_replaces_and_remove_drops(self):
+        self.index.add(MOVIE, 1, "Predator", "/ru/predator/", 5)
+        self.assertEqual(self.labels("termin"), ["The Terminal"])
+        self.assertEqual(self.labels("pred"), ["Predator"])
+        self.index.remove(MOVIE, 2)
+        self.index.remove(MOVIE, 42)
+        self.assertEqual(self.labels("t"), [])
+        self.assertEqual(len(self.index.keys), len(self.index.refs))
+
+
+class AutocompleteSyncTest(TestCase):
+    """Committed changes reach the index of every worker, rolled back ones none"""
+
+    def setUp(self):
+        # Rollbacks reset the version counter but not the indexes built on it
+        autocomplete._indexes.clear()
+        autocomplete.publish(MOVIE, [])
+
+    def labels(self, index):
+        return [result["label"] for result in index.search("pred")]
+
+    def test_other_worker_catches_up(self):
+        stale = autocomplete.build_index("ru", cache.namespace_version(autocomplete.NAMESPACE))
+        with self.captureOnCommitCallbacks(execute=True):
+            movie = create_movie("Predator")
+        self.assertEqual(self.labels(autocomplete.get_index("ru")), ["Predator"])
+        version = cache.namespace_version(autocomplete.NAMESPACE)
+        self.assertTrue(autocomplete.catch_up(stale, version))
+        self.assertEqual(self.labels(stale), ["Predator"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.delete()
+        self.assertEqual(self.labels(autocomplete.get_index("ru")), [])
+
+    def test_publishes_racing_on_the_cache_keep_their_changes(self):
+        version = cache.namespace_version(autocomplete.NAMESPACE)
+        stale = autocomplete.build_index("ru", version)
+        with self.captureOnCommitCallbacks(execute=False):
+            first, second = create_movie("Predator"), create_movie("Predators")
+        autocomplete.publish(MOVIE, [first.pk])
+        # A second worker whose non-atomic incr read the version before the first publish
+        cache.set_namespace_version(autocomplete.NAMESPACE, version)
+        autocomplete.publish(MOVIE, [second.pk])
+        self.assertTrue(autocomplete.catch_up(stale, cache.namespace_version(autocomplete.NAMESPACE)))
+        self.assertEqual(sorted(self.labels(stale)), ["Predator", "Predators"])
+
+    def test_uncommitted_save_is_not_indexed(self):
+        index = autocomplete.get_index("ru")
+        with self.captureOnCommitCallbacks(execute=False):
+            create_movie("Predator")
+        self.assertIs(autocomplete.get_index("ru"), index)
+        self.assertEqual(self.labels(index), [])
+
+    def test_limit_is_at_least_one(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_movie("Predator")
+        response = self.client.get("/ru/autocomplete/?q=pred&limit=-5")
+        self.assertEqual(len(response.json()["results"]), 1)
+
+
+class MovieCountersTest(TestCase):
+    """Saves and deletes keep counters equal to a full recount"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie, cls.other = create_movie(), create_movie("Predator")
+
+    def review(self, movie, parent=None):
+        return Reviews.objects.create(email="a@example.com", name="A", text="Text", movie=movie, parent=parent)
+
+    def counters(self, movie):
+        return Movie.objects.values_list("reviews_count", "threads_count", "shots_count").get(pk=movie.pk)
+
+    def assertCounters(self, movie, expected):
+        self.assertEqual(self.counters(movie), expected)
+        refresh_movies([movie.pk], touch=False)
+        self.assertEqual(self.counters(movie), expected)
+
+    def test_create_move_and_delete(self):
+        thread = self.review(self.movie)
+        reply = self.review(self.movie, parent=thread)
+        MovieShots.objects.create(title="Still", description="", image="movie_shots/still.jpg", movie=self.movie)
+        self.assertCounters(self.movie, (2, 1, 1))
+
+        reply.parent = None
+        reply.save()
+        self.assertCounters(self.movie, (2, 2, 1))
+        reply.movie = self.other
+        reply.save()
+        self.assertCounters(self.movie, (1, 1, 1))
+        self.assertCounters(self.other, (1, 1, 0))
+
+        MovieShots.objects.get().delete()
+        reply.delete()
+        self.assertCounters(self.movie, (1, 1, 0))
+        self.assertCounters(self.other, (0, 0, 0))
+
+    def test_deleted_thread_turns_replies_into_threads(self):
+        thread = self.review(self.movie)
+        self.review(self.movie, parent=thread)
+        self.review(self.movie, parent=thread)
+        thread.delete()
+        self.assertCounters(self.movie, (2, 2, 0))
+
+    def test_bulk_delete_of_thread_and_replies(self):
+        thread = self.review(self.movie)
+        reply = self.review(self.movie, parent=thread)
+        self.review(self.movie, parent=thread)
+        Reviews.objects.filter(pk__in=[thread.pk, reply.pk]).delete()
+        self.assertCounters(self.movie, (1, 1, 0))
+
+    def test_saving_a_stale_instance_keeps_counters(self):
+        stale = Movie.objects.get(pk=self.movie.pk)
+        self.review(self.movie)
+        stale.title = "The Terminator"
+        stale.save()
+        self.assertCounters(self.movie, (1, 1, 0))
+        self.assertEqual(Movie.objects.get(pk=self.movie.pk).title, "The Terminator")
+
+        actor = create_actor()
+        stale = Actor.objects.get(pk=actor.pk)
+        self.movie.actors.add(actor)
+        stale.save()
+        self.assertEqual(Actor.objects.get(pk=actor.pk).films_as_actor_count, 1)
+
+
+class BulkJobsTest(TestCase):
+    """Bulk jobs run in chunks, record failures and are resumed when their worker died"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category()
+        for number in range(5):
+            create_movie(f"Movie {number}", category=cls.category, draft=True)
+
+    def chunks_sent(self):
+        chunks = []
+        receiver = lambda sender, pks, **kwargs: chunks.append(pks)
+        bulk_changed.connect(receiver, weak=False)
+        self.addCleanup(bulk_changed.disconnect, receiver)
+        return chunks
+
+    def test_job_runs_in_chunks(self):
+        chunks = self.chunks_sent()
+        bulk.enqueue("publish", Movie.objects.all())
+        job = bulk.claim_next_job()
+        bulk.run_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("done", 5))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertFalse(Movie.objects.filter(draft=True).exists())
+
+    def test_failure_is_recorded(self):
+        calls = []
+
+        def fail_second_chunk(pks, params):
+            calls.append(pks)
+            if len(calls) == 2:
+                raise ValueError("boom")
+
+        bulk.enqueue("publish", Movie.objects.all())
+        job = bulk.claim_next_job()
+        with mock.patch.dict(bulk.ACTIONS, publish=fail_second_chunk), self.assertRaises(ValueError):
+            bulk.run_job(job, chunk_size=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("failed", 2))
+        self.assertIn("boom", job.error)
+
+    def test_stale_running_job_is_resumed(self):
+        job = bulk.enqueue("publish", Movie.objects.all())
+        BulkJob.objects.filter(pk=job.pk).update(status="running", processed=3, heartbeat_at=timezone.now())
+        self.assertIsNone(bulk.claim_next_job())
+
+        stale = timezone.now() - timedelta(seconds=settings.BULK_JOB_STALE_AFTER + 1)
+        BulkJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+        chunks = self.chunks_sent()
+        claimed = bulk.claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertIsNone(bulk.claim_next_job())
+        bulk.run_job(claimed, chunk_size=2)
+        self.assertEqual(chunks, [job.object_ids[3:]])
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_recategorize_rejects_unknown_category(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        response = self.client.post("/admin/movies/movie/", {
+            "action": "recategorize", "category": "999",
+            "_selected_action": list(Movie.objects.values_list("pk", flat=True)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors)
+        self.assertFalse(BulkJob.objects.exists())
+
+
+@override_settings(RATELIMIT_RATES={"ip": "3/m", "rating": "1/m", "review": "5/m"})
+class RateLimitTest(TestCase):
+    """Token buckets per endpoint and per client address"""
+
+    def setUp(self):
+        caches[settings.RATELIMIT_CACHE].clear()
+
+    def ip(self, remote, forwarded=None):
+        extra = {"HTTP_X_FORWARDED_FOR": forwarded} if forwarded else {}
+        return get_client_ip(RequestFactory().get("/", REMOTE_ADDR=remote, **extra))
+
+    def test_client_ip(self):
+        self.assertEqual(self.ip("203.0.113.5", "198.51.100.1"), "203.0.113.5")
+        self.assertEqual(self.ip("127.0.0.1", "198.51.100.1"), "198.51.100.1")
+        self.assertEqual(self.ip("127.0.0.1", "198.51.100.1, 203.0.113.9, ::1"), "203.0.113.9")
+        self.assertEqual(self.ip("127.0.0.1", "::1, 127.0.0.1"), "::1")
+        self.assertEqual(self.ip("127.0.0.1"), "127.0.0.1")
+
+    def test_over_limit_gets_429_without_draining_other_buckets(self):
+        self.assertNotEqual(self.client.post("/ru/add-rating/").status_code, 429)
+        for _ in range(2):
+            response = self.client.post("/ru/add-rating/")
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response["Retry-After"], "60")
+        tokens, _ = caches[settings.RATELIMIT_CACHE].get("rl:ip:127.0.0.1")
+        self.assertAlmostEqual(tokens, 2, places=2)
+
+    def test_bucket_refills(self):
+        buckets = [("rl:test:10.0.0.1", "2/m")]
+        with mock.patch("django_movie.ratelimit.time.time", return_value=1000.0):
+            self.assertEqual(take_tokens(buckets), 0)
+            self.assertEqual(take_tokens(buckets), 0)
+            self.assertAlmostEqual(take_tokens(buckets), 30)
+        with mock.patch("django_movie.ratelimit.time.time", return_value=1030.0):
+            self.assertEqual(take_tokens(buckets), 0)
+            self.assertGreater(take_tokens(buckets), 0)
+
+    def test_concurrent_requests_share_the_bucket(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(take_tokens([("rl:test:10.0.0.2", "5/m")])))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(results.count(0), range(1, 6))  # lock timeouts may refuse a few, never overspend
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class MovieBatchTest(TestCase):
+    """A batch costs one query per requested relation, whatever the number of movies"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, actor = create_category(), create_actor()
+        cls.movies = [create_movie(f"Terminator {i}", category=category) for i in range(5)]
+        for movie in cls.movies:
+            movie.actors.add(actor)
+
+    def test_query_count_is_fixed(self):
+        # The page state and the movies, then one query per relation
+        for fields in (["title"], ["title", "actors"], ["title", *NESTED_FIELDS]):
+            relations = len([field for field in fields if field in NESTED_FIELDS])
+            for movies in (self.movies[:1], self.movies):
+                ids = ",".join(str(movie.pk) for movie in movies)
+                with self.assertNumQueries(2 + relations):
+                    response = self.client.get(f"/ru/batch/?ids={ids}&fields={','.join(fields)}")
+                self.assertEqual(len(response.json()["movies"]), len(movies))
+
+
+class FilmographiesTest(TestCase):
+    """Hover cards get the latest movies of each actor, limited in the query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = create_category()
+        cls.actor, cls.director = create_actor(), create_actor("Director")
+        for year in (1984, 1991, 2003):
+            movie = create_movie(f"Movie {year}", year=year, category=category)
+            movie.actors.add(cls.actor)
+            if year == 1991:
+                movie.directors.add(cls.actor, cls.director)
+
+    def test_latest_movies_per_actor(self):
+        result = filmographies([self.actor.pk, self.director.pk, self.actor.pk, 999], limit=2, language="ru")
+        self.assertEqual([(card.year, roles) for card, roles in result[self.actor.pk]],
+                         [(2003, ["actor"]), (1991, ["director", "actor"])])
+        self.assertEqual([(card.year, roles) for card, roles in result[self.director.pk]], [(1991, ["director"])])
+        self.assertEqual(result[999], [])
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_endpoint(self):
+        response = self.client.get(f"/ru/filmographies/?actor={self.actor.pk}&actor={self.director.pk}&limit=1")
+        data = response.json()
+        self.assertEqual([movie["year"] for movie in data[str(self.actor.pk)]], [2003])
+        self.assertEqual([movie["year"] for movie in data[str(self.director.pk)]], [1991])
+
+
+class PrerenderTest(TestCase):
+    """Pages are rendered again only when the rows they show change"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = create_category()
+        cls.actor = create_actor()
+        cls.movies = [create_movie(f"Movie {number}", category=category) for number in range(5)]
+        cls.movies[4].actors.add(cls.actor)
+        cls.star = RatingStar.objects.create(value=5)
+
+    def changed(self, before):
+        return sorted(url for url, state in public_pages() if before.get(url) != state)
+
+    def test_vote_and_unrelated_review_change_nothing_shared(self):
+        before = dict(public_pages())
+        self.assertIn("/ru/movie-4/", before)
+        Rating.objects.create(ip="10.0.0.1", star=self.star, movie=self.movies[4])
+        self.assertEqual(self.changed(before), [])
+
+        Reviews.objects.create(email="a@example.com", name="A", text="Text", movie=self.movies[4])
+        self.assertEqual(self.changed(before), ["/en/movie-4/", "/ru/movie-4/"])
+
+    def test_title_change_reaches_lists_and_filmography(self):
+        before = dict(public_pages())
+        self.movies[4].title_ru = "Renamed"  # on the second list page, not in the sidebar
+        self.movies[4].save()
+        changed = self.changed(before)
+        for url in ("/ru/?page=2", "/ru/movie-4/", "/ru/actor/Actor/"):
+            self.assertIn(url, changed)
+        for url in ("/ru/", "/ru/movie-0/"):
+            self.assertNotIn(url, changed)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ConditionalPagesTest(CatalogTestCase):
+    """Pages answer 304 to their own ETag until something they show changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.genre = Genre.objects.create(name="Боевик", description="", url="action")
+        cls.movie.genres.add(cls.genre)
+        cls.star = RatingStar.objects.create(value=5)
+
+    def etag(self):
+        response = self.client.get("/ru/")
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.etag()
+        self.assertEqual(self.client.get("/ru/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changes_shown_on_the_page_change_the_etag(self):
+        def rename_genre():
+            self.genre.name = "Экшен"
+            self.genre.save()
+
+        changes = (
+            lambda: Reviews.objects.create(email="a@example.com", name="A", text="Good", movie=self.movie),
+            lambda: Rating.objects.create(ip="10.0.0.1", star=self.star, movie=self.movie),
+            rename_genre,
+        )
+        for change in changes:
+            etag = self.etag()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertNotEqual(self.etag(), etag)
+
+    def test_state_reads_cards_of_the_page_language(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/ru/")
+        sql = next(query["sql"] for query in queries if "movies_moviecard" in query["sql"] and "MAX" in query["sql"])
+        self.assertIn("\"language\" = 'ru'", sql)
+
+
+class RatingRollupTest(TestCase):
+    """Vote changes are rolled up into daily histograms and old months archived"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie = create_movie()
+        cls.stars = {value: RatingStar.objects.create(value=value) for value in (4, 5)}
+
+    def setUp(self):
+        # Rollbacks between tests send no signals
+        bump("movies")
+
+    def histogram(self):
+        return {row.star: (row.added, row.removed) for row in RatingDaily.objects.filter(movie=self.movie)}
+
+    def test_vote_change_moves_one_count(self):
+        save_rating("10.0.0.1", self.movie.pk, self.stars[4].pk)
+        save_rating("10.0.0.1", self.movie.pk, self.stars[5].pk)
+        call_command("rollup_ratings", lag=0, stdout=StringIO())
+        self.assertEqual(self.histogram(), {4: (1, 1), 5: (1, 0)})
+
+        self.assertEqual(rollup(lag=0), 0)
+        self.assertEqual(self.histogram(), {4: (1, 1), 5: (1, 0)})
+
+    def test_archive_removes_only_old_months(self):
+        save_rating("10.0.0.1", self.movie.pk, self.stars[4].pk)
+        save_rating("10.0.0.2", self.movie.pk, self.stars[5].pk)
+        RatingEvent.objects.filter(star=4).update(month=202001)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with self.assertRaises(CommandError):
+            call_command("archive_rating_events", dir=directory.name, stdout=StringIO())
+
+        rollup(lag=0)
+        call_command("archive_rating_events", dir=directory.name, stdout=StringIO())
+        self.assertEqual(list(RatingEvent.objects.values_list("star", flat=True)), [5])
+        with gzip.open(os.path.join(directory.name, "rating_events_202001.jsonl.gz"), "rt") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+
+class MovieCardsTest(CatalogTestCase):
+    """Cards follow their movie; votes update only the rating summary"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.genre = Genre.objects.create(name="Боевик", description="", url="action")
+        cls.movie.genres.add(cls.genre)
+        cls.star = RatingStar.objects.create(value=4)
+
+    def test_cards_follow_movie(self):
+        self.assertEqual(sorted(self.movie.cards.values_list("language", flat=True)),
+                         sorted(code for code, _ in settings.LANGUAGES))
+        self.assertEqual(cards("ru").get().genre_ids, f",{self.genre.pk},")
+        self.movie.draft = True
+        self.movie.save()
+        self.assertFalse(self.movie.cards.exists())
+
+    def test_vote_updates_rating_only(self):
+        with mock.patch("movies.cards.rendition_for") as rendition_for, \
+                CaptureQueriesContext(connection) as queries:
+            Rating.objects.create(ip="10.0.0.1", star=self.star, movie=self.movie)
+        rendition_for.assert_not_called()
+        self.assertFalse([q["sql"] for q in queries.captured_queries
+                          if "movies_movie_genres" in q["sql"] or q["sql"].startswith("DELETE")])
+        card = cards("ru").get()
+        self.assertEqual((card.rating_avg, card.rating_count), (4, 1))
+        self.assertEqual(card.genres, "Боевик")
+
+        Rating.objects.get().delete()
+        card = cards("ru").get()
+        self.assertEqual((card.rating_avg, card.rating_count), (None, 0))
+
+    def test_filter_cards(self):
+        other = Genre.objects.create(name="Драма", description="", url="drama")
+        self.assertEqual(filter_cards(cards("ru"), [1984], []).count(), 1)
+        self.assertEqual(filter_cards(cards("ru"), [], [str(self.genre.pk)]).count(), 1)
+        self.assertEqual(filter_cards(cards("ru"), [1999], [str(other.pk), "x"]).count(), 0)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class HotObjectsTest(CatalogTestCase):
+    """Detail pages reuse loaded movies and actors until a change bumps their version"""
+
+    def setUp(self):
+        # Rollbacks between tests send no signals
+        bump("movie_objects")
+        bump("actor_objects")
+
+    def page_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        return len(queries)
+
+    def test_second_view_skips_object_queries(self):
+        for url in (self.movie.get_absolute_url(), self.actor.get_absolute_url()):
+            first = self.page_queries(url)
+            self.assertLess(self.page_queries(url), first, url)
+
+    def test_changes_reach_cached_objects(self):
+        self.assertEqual(movie_by_pk(self.movie.pk).reviews_count, 0)
+        Reviews.objects.create(email="a@example.com", name="A", text="Good", movie=self.movie)
+        self.assertEqual(movie_by_pk(self.movie.pk).reviews_count, 1)
+
+        self.client.get(self.actor.get_absolute_url())
+        self.actor.name = "Renamed"
+        self.actor.save()
+        self.assertEqual(self.client.get("/ru/actor/Actor/").status_code, 404)
+        self.assertEqual(self.client.get(self.actor.get_absolute_url()).status_code, 200)
+
+    def test_unknown_slug_is_404(self):
+        self.assertEqual(self.client.get("/ru/missing/").status_code, 404)
+
+
+class StaticFilesTest(SimpleTestCase):
+    """Precompressed variants by Accept-Encoding and cache headers of static files"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name in ("app.css", "app.css.br", "app.css.gz", "app.0123abcd.css"):
+            with open(os.path.join(directory.name, name), "w") as f:
+                f.write(name)
+        with self.settings(STATIC_ROOT=directory.name):
+            self.middleware = StaticFilesMiddleware(lambda request: None)
+        self.middleware.immutable = {"app.0123abcd.css"}
+
+    def get(self, name, accept=""):
+        request = RequestFactory().get("/static/" + name, HTTP_ACCEPT_ENCODING=accept)
+        response = self.middleware(request)
+        self.addCleanup(response.close)
+        return response
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(parse_accept_encoding("gzip, br;q=0"), {"gzip": 1.0, "br": 0.0})
+        self.assertEqual(parse_accept_encoding("GZIP;q=0.5, *;Q=0.1"), {"gzip": 0.5, "*": 0.1})
+        self.assertEqual(parse_accept_encoding("br;q=high"), {"br": 0.0})
+        self.assertEqual(parse_accept_encoding(""), {})
+
+    def test_encoding_selection(self):
+        for accept, encoding in (
+            ("gzip, deflate, br", "br"),
+            ("gzip, br;q=0", "gzip"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("br;q=0, gzip;q=0", None),
+            ("*", "br"),
+            ("*;q=0, gzip", "gzip"),
+            ("identity", None),
+            ("", None),
+        ):
+            response = self.get("app.css", accept)
+            self.assertEqual(response.get("Content-Encoding"), encoding, accept)
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_cache_headers(self):
+        self.assertEqual(self.get("app.0123abcd.css")["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(self.get("app.css")["Cache-Control"], "public, max-age=3600")
+
+
+class CompressionTest(SimpleTestCase):
+    """Negotiated compression of responses, cached once per page version"""
+    body = ("<p>Terminator</p>" * 200).encode()
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def get(self, response, accept="gzip"):
+        request = RequestFactory().get("/ru/", HTTP_ACCEPT_ENCODING=accept)
+        return compression.CompressionMiddleware(lambda request: response)(request)
+
+    def page(self, **headers):
+        response = HttpResponse(self.body, content_type="text/html")
+        response["ETag"] = '"v1"'
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate("gzip, deflate, br"), "br" if compression.brotli else "gzip")
+        self.assertEqual(compression.negotiate("gzip, br;q=0"), "gzip")
+        self.assertEqual(compression.negotiate("*"), "br" if compression.brotli else "gzip")
+        self.assertIsNone(compression.negotiate("gzip;q=0, br;q=0"))
+        self.assertIsNone(compression.negotiate("identity"))
+
+    def test_cacheable_page_is_compressed_once_with_a_weak_etag(self):
+        with mock.patch("django_movie.compression.compress", wraps=compression.compress) as compress:
+            for _ in range(2):
+                response = self.get(self.page())
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(response["ETag"], 'W/"v1"')
+                self.assertEqual(zlib.decompress(response.content, 31), self.body)
+        self.assertEqual(compress.call_count, 1)
+
+    def test_private_and_cookie_responses_are_not_cached(self):
+        def private():
+            return self.page(**{"Cache-Control": "private"})
+
+        def with_cookie():
+            response = self.page()
+            response.set_cookie("csrftoken", "token")
+            return response
+
+        for make_response in (private, with_cookie):
+            with mock.patch("django_movie.compression.compress", wraps=compression.compress) as compress:
+                for _ in range(2):
+                    self.assertEqual(zlib.decompress(self.get(make_response()).content, 31), self.body)
+            self.assertEqual(compress.call_count, 2)
+
+    def test_streaming_response_is_compressed_by_chunk(self):
+        response = self.get(StreamingHttpResponse(iter([self.body, self.body]), content_type="text/html"))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(zlib.decompress(b"".join(response.streaming_content), 31), self.body * 2)
+
+    def test_skipped_responses(self):
+        self.assertFalse(self.get(self.page(), accept="").has_header("Content-Encoding"))
+        self.assertFalse(self.get(HttpResponse(b"short", content_type="text/html")).has_header("Content-Encoding"))
+        self.assertFalse(self.get(HttpResponse(self.body, content_type="image/png")).has_header("Content-Encoding"))
+        self.assertEqual(self.get(self.page(), accept="")["Vary"], "Accept-Encoding")
+
+
+class UploadsTest(TestCase):
+    """CKEditor uploads are stored once per content, resized, and used by descriptions"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.storage = FileSystemStorage(location=directory.name)
+
+    def image(self, size=(3000, 2000)):
+        output = BytesIO()
+        Image.new("RGB", size, (200, 30, 30)).save(output, format="JPEG")
+        return output.getvalue()
+
+    def upload(self, data, name):
+        return OptimizingImageBackend(self.storage, ContentFile(data, name=name)).save_as(f"uploads/2024/{name}")
+
+    def test_same_bytes_are_stored_once(self):
+        data = self.image()
+        first = self.upload(data, "a.jpg")
+        self.assertEqual(self.upload(data, "b.jpg"), first)
+        directory = os.path.dirname(first)
+        self.assertEqual(len([name for name in self.storage.listdir(directory)[1] if "_thumb." not in name]), 1)
+
+    def test_large_images_are_resized(self):
+        with self.storage.open(self.upload(self.image(), "a.jpg")) as f:
+            self.assertEqual(Image.open(f).size, (1600, 1067))
+        with self.storage.open(self.upload(self.image((300, 200)), "b.jpg")) as f:
+            self.assertEqual(Image.open(f).size, (300, 200))
+
+    def test_descriptions_point_at_renditions_on_save(self):
+        path = default_storage.save("uploads/2024/a.jpg", ContentFile(self.image()))
+        movie = create_movie(description=f'<p><img alt="" src="/media/{path}"></p>')
+        description = Movie.objects.get(pk=movie.pk).description
+        self.assertRegex(description, r'<img alt="" src="/media/uploads/optimized/\w\w/\w{64}\.jpg">')
+
+
+class MediaServingTest(SimpleTestCase):
+    """Byte ranges and access control of serve_media"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        os.mkdir(os.path.join(self.root, "private"))
+        with open(os.path.join(self.root, "private", "a.txt"), "w") as f:
+            f.write("secret")
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-2000", 1000), (0, 999))
+        self.assertEqual(parse_range("bytes=500-", 1000), (500, 999))
+        self.assertEqual(parse_range("bytes=900-5000", 1000), (900, 999))
+        self.assertIs(parse_range("bytes=1000-", 1000), False)
+        self.assertIs(parse_range("bytes=-0", 1000), False)
+        self.assertIs(parse_range("bytes=5-4", 1000), False)
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("bytes=-", 1000))
+        self.assertIsNone(parse_range("items=0-1", 1000))
+
+    def test_protected_files_are_forbidden_whether_they_exist_or_not(self):
+        with self.settings(MEDIA_ROOT=self.root, MEDIA_PROTECTED_PREFIXES=["private/"]):
+            for path in ("private/a.txt", "private/missing.txt"):
+                request = RequestFactory().get("/media/" + path)
+                request.user = AnonymousUser()
+                self.assertEqual(serve_media(request, path).status_code, 403, path)
+
+
+@override_settings(
+    FLATPAGES_MAP_TTL=0, STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class FlatpageFallbackTest(TestCase):
+    """404s are answered from the cached url map of flatpages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for url, title in (("/about/", "О нас"), ("/en/terms/", "Terms")):
+            page = FlatPage.objects.create(url=url, title=title, content=title, template_name="pages/about.html")
+            page.sites.add(settings.SITE_ID)
+
+    def setUp(self):
+        # Rollbacks between tests send no signals
+        bump("flatpages")
+        # LocaleMiddleware leaves the language of the last request active
+        self.addCleanup(translation.activate, settings.LANGUAGE_CODE)
+
+    def test_unprefixed_page_is_served_in_every_language(self):
+        for url in ("/ru/about/", "/en/about/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, "О нас")
+
+    def test_prefixed_page_is_served_in_its_language(self):
+        self.assertContains(self.client.get("/en/terms/"), "Terms")
+        self.assertEqual(self.client.get("/ru/terms/").status_code, 404)
+
+    def test_unknown_path_skips_flatpage_queries(self):
+        self.client.get("/ru/about/")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/ru/wp-login.php").status_code, 404)
+        self.assertFalse([query for query in queries if "django_flatpage" in query["sql"]])
+
+    def test_changes_reach_the_map(self):
+        self.assertEqual(self.client.get("/ru/rules/").status_code, 404)
+        page = FlatPage.objects.create(url="/rules/", title="Правила", content="Правила", template_name="pages/about.html")
+        page.sites.add(settings.SITE_ID)
+        self.assertContains(self.client.get("/ru/rules/"), "Правила")
+        page.delete()
+        self.assertEqual(self.client.get("/ru/rules/").status_code, 404)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ProfilingTest(TestCase):
+    """Requests with a signed token are profiled, others are not"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(PROFILING_DIR=self.directory))
+
+    def profiles(self):
+        return [name for _, _, names in os.walk(self.directory) for name in names]
+
+    def test_signed_token_writes_a_profile(self):
+        response = self.client.get("/ru/", HTTP_X_PROFILE_TOKEN=make_token())
+        self.assertEqual(self.profiles(), [response["X-Profile"]])
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, "movie_list", response["X-Profile"])))
+
+        output = StringIO()
+        call_command("profile_report", stdout=output)
+        self.assertEqual(output.getvalue(), "movie_list: 1 cProfile, 0 sampled\n")
+
+    def test_unsigned_token_is_ignored(self):
+        for token in ("profile", make_token() + "x"):
+            response = self.client.get("/ru/", HTTP_X_PROFILE_TOKEN=token)
+            self.assertFalse(response.has_header("X-Profile"), token)
+        self.assertEqual(self.profiles(), [])
+
+
+# warm_up closes the connections, which the transaction of a TestCase would not survive
+class WarmUpTest(TransactionTestCase):
+    """Workers warm up against the database before taking traffic"""
+
+    def test_every_step_runs(self):
+        create_movie()
+        autocomplete._indexes.clear()
+        timings = warm_up(force=True)
+        self.assertEqual(list(timings), [step.__name__ for step in STEPS])
+        self.assertEqual([result["label"] for result in autocomplete._indexes["ru"].search("term")], ["Terminator"])
+
+    def test_disabled(self):
+        with self.settings(WARMUP_ON_START=False):
+            self.assertEqual(warm_up(), {})
+
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   django.utils\n"
+            "import time:        80 |        200 | django\n"
+            "import time:        50 |         50 | PIL.Image\n"
+        )
+        self.assertEqual(parse_importtime(output), {"django": 200, "PIL": 50})
+
+
+@unittest.skipIf(django.VERSION >= (4, 1), "CONN_HEALTH_CHECKS is built in")
+class ConnectionHealthTest(TransactionTestCase):
+    """A connection that went away is closed before the next request uses it"""
+
+    def setUp(self):
+        Category.objects.exists()  # opens the connection
+        self.enterContext(mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True))
+        self.close = self.enterContext(mock.patch.object(connection, "close"))
+
+    def test_connected_to_request_started(self):
+        self.assertIn(check_connections, [receiver() for _, receiver in request_started.receivers])
+
+    def test_unusable_connection_is_closed(self):
+        with mock.patch.object(connection, "is_usable", return_value=False):
+            check_connections()
+        self.close.assert_called_once_with()
+
+    def test_usable_connection_is_kept(self):
+        check_connections()
+        self.close.assert_not_called()
+
+    def test_connection_in_a_transaction_is_kept(self):
+        with mock.patch.object(connection, "is_usable", return_value=False), transaction.atomic():
+            check_connections()
+        self.close.assert_not_called()
+
+
+@unittest.skipUnless("sqlite" in settings.DATABASES, "needs DATABASE_BACKEND=postgresql")
+class SqliteToPostgresTest(TestCase):
+    """migrate_sqlite_to_postgres copies rows, m2m links and translations, then resets sequences"""
+    databases = {"default", "sqlite"} if "sqlite" in settings.DATABASES else {"default"}
+
+    def test_copy(self):
+        category = Category.objects.using("sqlite").create(name="Фильмы", description="", url="films")
+        genre = Genre.objects.using("sqlite").create(name="Боевик", description="", url="action")
+        Movie.objects.using("sqlite").bulk_create([Movie(
+            id=7, title_ru="Терминатор", title_en="The Terminator", description="Line\tone\nline two \\ end",
+            poster="movies/terminator.jpg", year=1984, category=category, url="terminator",
+            budget=6400000, fees_in_world=2_800_000_000,
+        )])
+        Movie.genres.through.objects.using("sqlite").create(movie_id=7, genre=genre)
+        star = RatingStar.objects.using("sqlite").create(value=5)
+        Rating.objects.using("sqlite").bulk_create([Rating(ip="10.0.0.1", star=star, movie_id=7)])
+
+        call_command("migrate_sqlite_to_postgres", chunk_size=1, stdout=StringIO())
+
+        movie = Movie.objects.get(pk=7)
+        self.assertEqual((movie.title_ru, movie.title_en), ("Терминатор", "The Terminator"))
+        self.assertEqual(movie.description, "Line\tone\nline two \\ end")
+        self.assertEqual(movie.fees_in_world, 2_800_000_000)
+        self.assertEqual(list(movie.genres.values_list("pk", flat=True)), [genre.pk])
+        self.assertEqual(Rating.objects.get().ip, "10.0.0.1")
+        self.assertGreater(Category.objects.create(name="Сериалы", description="", url="series").pk, category.pk)
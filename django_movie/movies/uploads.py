@@ -0,0 +1,113 @@
+"""Deduplicated, resized CKEditor uploads
+
+Images are stored once per content hash under
+CKEDITOR_UPLOAD_PATH/optimized/, scaled down to CKEDITOR_MAX_IMAGE_SIZE
+and re-encoded. Descriptions that still point at original uploads are
+rewritten to those renditions.
+"""
+import hashlib
+import os
+import re
+from io import BytesIO
+
+from ckeditor_uploader import utils
+from ckeditor_uploader.backends import PillowBackend
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+RENDITIONS_PATH = os.path.join(settings.CKEDITOR_UPLOAD_PATH, "optimized")
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif"}
+
+IMG_SRC_RE = re.compile(
+    r'(<img\b[^>]*?\bsrc=["\'])%s(%s[^"\']+)(["\'])' % (
+        re.escape(settings.MEDIA_URL), re.escape(settings.CKEDITOR_UPLOAD_PATH)
+    ),
+    re.IGNORECASE,
+)
+
+
+def optimize_image(content):
+    """Scaled down and re-encoded image as (bytes, extension), None if not an image"""
+    try:
+        image = Image.open(BytesIO(content))
+        image.load()
+    except (OSError, Image.DecompressionBombError):
+        return None
+    if getattr(image, "is_animated", False):
+        return content, FORMAT_EXTENSIONS.get(image.format, ".gif")
+    original_format, original_size = image.format, image.size
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(settings.CKEDITOR_MAX_IMAGE_SIZE, Image.LANCZOS)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    output = BytesIO()
+    if has_alpha:
+        image.save(output, format="PNG", optimize=True)
+        extension = ".png"
+    else:
+        image.convert("RGB").save(
+            output, format="JPEG", quality=settings.CKEDITOR_IMAGE_QUALITY, optimize=True, progressive=True
+        )
+        extension = ".jpg"
+    data = output.getvalue()
+    unchanged = image.size == original_size and FORMAT_EXTENSIONS.get(original_format) == extension
+    if unchanged and len(data) >= len(content):
+        return content, extension
+    return data, extension
+
+
+def store_rendition(storage, content):
+    """Path of the optimized rendition of content, saved unless it already exists"""
+    digest = hashlib.sha256(content).hexdigest()
+    for extension in (".jpg", ".png", ".gif"):
+        name = os.path.join(RENDITIONS_PATH, digest[:2], digest + extension)
+        if storage.exists(name):
+            return name
+    optimized = optimize_image(content)
+    if optimized is None:
+        return None
+    data, extension = optimized
+    name = os.path.join(RENDITIONS_PATH, digest[:2], digest + extension)
+    return storage.save(name, ContentFile(data))
+
+
+def is_rendition(path):
+    return path.startswith(RENDITIONS_PATH + "/")
+
+
+def rendition_for(storage, path):
+    """Rendition path for an uploaded file path, or None"""
+    if is_rendition(path):
+        return path
+    if not storage.exists(path):
+        return None
+    with storage.open(path) as f:
+        return store_rendition(storage, f.read())
+
+
+def rewrite_images(html, renditions):
+    """Point <img> tags at renditions; renditions maps upload path -> rendition path or None"""
+    def replace(match):
+        rendition = renditions(match.group(2)) if callable(renditions) else renditions.get(match.group(2))
+        if not rendition or rendition == match.group(2):
+            return match.group(0)
+        return match.group(1) + settings.MEDIA_URL + rendition + match.group(3)
+
+    return IMG_SRC_RE.sub(replace, html) if html else html
+
+
+class OptimizingImageBackend(PillowBackend):
+    """ckeditor_uploader backend storing each image once, resized and re-encoded"""
+
+    def save_as(self, filepath):
+        if not self.is_image:
+            return self.storage_engine.save(filepath, self.file_object)
+        self.file_object.seek(0)
+        saved_path = store_rendition(self.storage_engine, self.file_object.read())
+        if saved_path is None:
+            self.file_object.seek(0)
+            return self.storage_engine.save(filepath, self.file_object)
+        if not self.storage_engine.exists(utils.get_thumb_filename(saved_path)):
+            with self.storage_engine.open(saved_path) as f:
+                self.create_thumbnail(BytesIO(f.read()), saved_path)
+        return saved_path
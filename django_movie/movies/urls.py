@@ -3,12 +3,16 @@ from django.urls import URLPattern, path
 from . import views
 
 urlpatterns = [
-    path("", views.MoviesView.as_view()),
+    path("", views.MoviesView.as_view(), name="movie_list"),
     path("filter/", views.FilterMoviesView.as_view(), name='filter'),
     path("search/", views.Search.as_view(), name='search'),
+    path("autocomplete/", views.Autocomplete.as_view(), name='autocomplete'),
     path("add-rating/", views.AddStarRating.as_view(), name='add_rating'),
     path("json-filter/", views.JsonFilterMoviesView.as_view(), name='json_filter'),
+    path("filmographies/", views.FilmographiesView.as_view(), name='filmographies'),
+    path("batch/", views.MovieBatchView.as_view(), name='movie_batch'),
     path("<slug:slug>/", views.MovieDetailView.as_view(), name="movie_detail"),
     path("review/<int:pk>/", views.AddReview.as_view(), name="add_review"),
     path("actor/<str:slug>/", views.ActorView.as_view(), name="actor_detail"),
+    path("actor/<str:slug>/filmography/", views.FilmographyView.as_view(), name="actor_filmography"),
 ]
\ No newline at end of file
@@ -1,48 +1,96 @@
 from multiprocessing import context
+from django.conf import settings
 from django.views.generic import ListView, DetailView
 from django.shortcuts import render, redirect
 from django.views import View
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
+from django.utils.decorators import method_decorator
 
+from django_movie.cache import get_or_compute
+from django_movie.ratelimit import RateLimitMixin, get_client_ip
+from django_movie.surrogate import CATALOG, MOVIE_LIST, add_keys, object_keys
 
-from .models import Actor, Movie, Category, Genre, Rating
+
+from .models import Actor, Movie, Category, Genre
 from .forms import ReviewForm, RatingForm
+from .autocomplete import autocomplete
+from .batch import batch_keys, load_movies, parse_fields, serialize
+from .cards import cards, filter_cards
+from .filmography import card_json, filmographies, filmography_page
+from .hot_objects import actor_by_slug, movie_by_pk, movie_by_slug
+from .ratings import save_rating
+from .conditional import actor_state, conditional_page, movie_detail_state, movie_list_state
 
 class GenreYear:
     """Film genres and release years"""
     def get_genres(self):
-        return Genre.objects.all()
+        return get_or_compute("movies", "genres", lambda: list(Genre.objects.all()))
 
     def get_years(self):
-        return Movie.objects.filter(draft=False).values("year")
+        return get_or_compute("movies", "years", lambda: list(Movie.objects.filter(draft=False).values("year")))
+
+
+def tag_movie_list(request, movie_list):
+    add_keys(request, MOVIE_LIST, *object_keys("movie", [card.movie_id for card in movie_list]))
+
+
+def cast_ids(movie):
+    """From the prefetched cast of hot movies"""
+    return {actor.pk for actor in movie.actors.all()} | {actor.pk for actor in movie.directors.all()}
 
 
+class HotObjectMixin:
+    """get_object() from the per-worker hot object cache, see hot_objects.py"""
+    hot_lookup = None
+
+    def get_object(self, queryset=None):
+        obj = self.hot_lookup(self.kwargs[self.slug_url_kwarg])
+        if obj is None:
+            raise Http404(f"No {self.model._meta.verbose_name} found matching the query")
+        return obj
+
+
+@method_decorator(conditional_page(movie_list_state), name="dispatch")
 class MoviesView(GenreYear, ListView):
     """List of films"""
-    model = Movie
-    queryset = Movie.objects.filter(draft=False)
+    template_name = "movies/movie_list.html"
+    context_object_name = "movie_list"
     paginate_by = 3
 
+    def get_queryset(self):
+        return cards()
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        tag_movie_list(self.request, context["movie_list"])
+        return context
+
     
 		 
-class MovieDetailView(GenreYear, DetailView):
+@method_decorator(conditional_page(movie_detail_state), name="dispatch")
+class MovieDetailView(HotObjectMixin, GenreYear, DetailView):
     """Full movie description"""
     model = Movie
     slug_field = "url"
+    hot_lookup = staticmethod(movie_by_slug)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["star_form"] = RatingForm()
         context['form'] = ReviewForm()
+        add_keys(self.request, f"movie-{self.object.pk}", *object_keys("actor", cast_ids(self.object)))
         return context
 
 
-class AddReview(View):
+class AddReview(RateLimitMixin, View):
     """Reviews"""
+    ratelimit_scope = "review"
+
     def post(self, request, pk):
         form = ReviewForm(request.POST)
-        movie = Movie.objects.get(id=pk)
+        movie = movie_by_pk(pk)
+        if movie is None:
+            raise Http404("No movie found matching the query")
         if form.is_valid():
             form = form.save(commit=False)
             if request.POST.get("parent", None):
@@ -51,84 +99,145 @@ class AddReview(View):
             form.save()
         return redirect(movie.get_absolute_url())
 
-class ActorView(GenreYear, DetailView):
+@method_decorator(conditional_page(actor_state), name="dispatch")
+class ActorView(HotObjectMixin, GenreYear, DetailView):
     """Getting information about an actor"""
     model = Actor
     template_name = 'movies/actor.html'
     slug_field = "name"
+    hot_lookup = staticmethod(actor_by_slug)
+    filmography_per_page = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["page_obj"] = filmography_page(self.object, self.request.GET.get("page"), self.filmography_per_page)
+        context["paginator"] = context["page_obj"].paginator
+        add_keys(self.request, f"actor-{self.object.pk}",
+                 *object_keys("movie", [card.movie_id for card in context["page_obj"]]))
+        return context
+
+
+@method_decorator(conditional_page(actor_state), name="dispatch")
+class FilmographyView(HotObjectMixin, DetailView):
+    """Filmography page of an actor as json"""
+    model = Actor
+    slug_field = "name"
+    hot_lookup = staticmethod(actor_by_slug)
+    per_page = 20
+
+    def get(self, request, *args, **kwargs):
+        actor = self.get_object()
+        page = filmography_page(actor, request.GET.get("page"), self.per_page)
+        add_keys(request, f"actor-{actor.pk}", *object_keys("movie", [card.movie_id for card in page]))
+        return JsonResponse({
+            "actor": actor.name,
+            "count": page.paginator.count,
+            "num_pages": page.paginator.num_pages,
+            "page": page.number,
+            "results": [card_json(card, card.roles) for card in page.object_list],
+        })
+
+
+class FilmographiesView(View):
+    """Latest movies of many actors at once, for cast hover cards"""
+    max_actors = 50
+
+    def get(self, request):
+        try:
+            ids = [int(pk) for pk in request.GET.getlist("actor")[:self.max_actors]]
+            limit = min(int(request.GET.get("limit", 5)), 20)
+        except ValueError:
+            return JsonResponse({"error": "bad request"}, status=400)
+        result = filmographies(ids, limit)
+        add_keys(request, *object_keys("actor", ids), *object_keys("movie", {
+            card.movie_id for movies in result.values() for card, _ in movies}))
+        return JsonResponse({
+            str(actor_id): [card_json(card, roles) for card, roles in movies]
+            for actor_id, movies in result.items()
+        })
 
 
 class FilterMoviesView(GenreYear, ListView):
     """"Movie filter"""
+    template_name = "movies/movie_list.html"
+    context_object_name = "movie_list"
     paginate_by = 2
     def get_queryset(self):
-        queryset = Movie.objects.filter(
-            Q(year__in=self.request.GET.getlist('year')) | 
-            Q(genres__in=self.request.GET.getlist("genre"))
-            ).distinct()
-        return queryset
+        return filter_cards(cards(), self.request.GET.getlist('year'), self.request.GET.getlist("genre"))
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         context['year'] = ''.join([f'year={x}&' for x in self.request.GET.getlist('year')])
         context['genre'] = ''.join([f'genre={x}&' for x in self.request.GET.getlist('genre')])
+        tag_movie_list(self.request, context["movie_list"])
         return context
 
 
+@method_decorator(conditional_page(movie_list_state), name="dispatch")
 class JsonFilterMoviesView(ListView):
     """json movie filter"""
     def get_queryset(self):
-        queryset = Movie.objects.filter(
-            Q(year__in=self.request.GET.getlist("year")) |
-            Q(genres__in=self.request.GET.getlist("genre"))
-        ).distinct().values("title", "tagline", "url", "poster")
-        return queryset
+        return filter_cards(cards(), self.request.GET.getlist("year"), self.request.GET.getlist("genre")).values(
+            "movie_id", "title", "tagline", "url", "poster", "year", "genres", "rating_avg", "rating_count")
 
     def get(self, request, *args, **kwargs):
         queryset = list(self.get_queryset())
+        add_keys(request, MOVIE_LIST, CATALOG, *object_keys("rating", [row.pop("movie_id") for row in queryset]))
         return JsonResponse({"movies": queryset}, safe=False)
 
 
-class AddStarRating(View):
+@method_decorator(conditional_page(movie_list_state), name="dispatch")
+class MovieBatchView(View):
+    """Many movies with the fields in ?fields= by ?ids=1,2 and/or ?slugs=a,b"""
+
+    def get(self, request):
+        try:
+            ids = [int(pk) for pk in request.GET.get("ids", "").split(",") if pk]
+            slugs = [slug for slug in request.GET.get("slugs", "").split(",") if slug]
+            fields = parse_fields(request.GET.get("fields"))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if len(ids) + len(slugs) > settings.MOVIE_BATCH_LIMIT:
+            return JsonResponse({"error": f"At most {settings.MOVIE_BATCH_LIMIT} movies"}, status=400)
+        movies, missing = load_movies(request, ids, slugs)
+        rows = serialize(request, movies, fields)
+        add_keys(request, *batch_keys(movies, rows, fields))
+        return JsonResponse({"movies": rows, "missing": missing})
+
+
+class AddStarRating(RateLimitMixin, View):
     """Adding a Movie Rating"""
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+    ratelimit_scope = "rating"
 
     def post(self, request):
         form = RatingForm(request.POST)
         if form.is_valid():
-            Rating.objects.update_or_create(
-                ip=self.get_client_ip(request),
-                movie_id=int(request.POST.get("movie")),
-                defaults={'star_id': int(request.POST.get("star"))}
-            )
+            save_rating(get_client_ip(request), int(request.POST.get("movie")), int(request.POST.get("star")))
             return HttpResponse(status=201)
         else:
             return HttpResponse(status=400)
 
 class Search(ListView):
     """Movie search"""
+    template_name = "movies/movie_list.html"
+    context_object_name = "movie_list"
     paginate_by = 3
 
     def get_queryset(self):
-        return Movie.objects.filter(title__icontains=self.request.GET.get('q'))
+        return cards().filter(title__icontains=self.request.GET.get('q'))
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         context['q'] = f"q={self.request.GET.get('q')}&"
+        tag_movie_list(self.request, context["movie_list"])
         return context
 
 
-
-
-
-
-
-
-
-
+class Autocomplete(View):
+    """Movie titles and actor names starting with q"""
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.GET.get("limit", settings.AUTOCOMPLETE_LIMIT)), 50))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_LIMIT
+        return JsonResponse({"results": autocomplete(request.GET.get("q", ""), limit)})